@@ -1,14 +1,253 @@
 from .simulator import Simulator
+from .trajectory import TrajectoryReader, FIELDS, _interpolate
+from .cache import ParseCache, CACHE_SIZE
+from .forces import potentialEnergy, CHUNK_MEMORY
+from .decimate import decimate
 import os
 import csv
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-from bokeh.io import push_notebook, show, output_notebook
-from bokeh.plotting import figure
+class MassData(Mapping):
+    """
+    A dictionary of the saved data of every mass, read only when it is used.
+
+    Looking up a mass gives the same (snapshots, 15) array as before, with the
+    time in the first column followed by the saved fields. Masses saved in a
+    trajectory file are read through its memory map, and column() reads a
+    single field of a mass without building the whole array.
+
+    Everything read is kept along with where in its file it ended, so
+    refresh() only has to read and append what has been written since.
+    Parsed .csv files are also kept in a ParseCache, when one is given, so
+    they are not parsed again in later sessions.
+    """
+
+    def __init__(self, cache=None):
+        """
+        A constructor for a MassData
+
+        Parameters:
+            cache (ParseCache): Where to keep parsed .csv files, or None
+        """
+        self.cache = cache
+        self._sources = {}
+        # Arrays read so far, by name or (name, field), as [array, position]
+        self._loaded = {}
+
+
+    def addCSV(self, name, path):
+        """
+        A function to add a mass saved as a .csv file.
+
+        Parameters:
+            name (str): The name of the mass
+            path (str): The .csv file
+        """
+        self._sources[name] = ('csv', path)
+        self._forget(name)
+
+
+    def addTrajectory(self, name, reader):
+        """
+        A function to add a mass saved in a trajectory file.
+
+        Parameters:
+            name (str): The name of the mass
+            reader (TrajectoryReader): The reader of the file
+        """
+        self._sources[name] = ('nbt', reader)
+        self._forget(name)
+
+
+    def remove(self, name):
+        """
+        A function to drop a mass and everything read for it.
+
+        Parameters:
+            name (str): The name of the mass
+        """
+        del self._sources[name]
+        self._forget(name)
+
+
+    def _forget(self, name):
+        """
+        A function used to drop everything read for a mass.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            name (str): The name of the mass
+        """
+
+        for key in [k for k in self._loaded if k == name or (isinstance(k, tuple) and k[0] == name)]:
+            del self._loaded[key]
+
+
+    def _readCSV(self, path, offset=0):
+        """
+        A function used to parse a .csv file of one mass from a byte offset.
+
+        Only complete lines are parsed, so a line that is still being written
+        is left for the next call.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            path (str): The .csv file
+            offset (int): Where the last call stopped, or 0 for the start
+
+        Returns:
+            tuple: (data, offset), a (rows, 15) array of the new rows and the
+                   offset to carry on from
+        """
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            text = f.read()
+        end = text.rfind(b'\n') + 1
+        lines = text[:end].decode('utf-8').splitlines()
+        if offset == 0:
+            lines = lines[1:]
+        rows = [[float(v) for v in row] for row in csv.reader(lines) if row]
+        data = np.array(rows, dtype=np.float64).reshape(-1, 1 + len(FIELDS))
+        return data, offset + end
+
+
+    def _read(self, key, position=None):
+        """
+        A function used to read a mass, or one field of it, from a position.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            key: A name, or (name, field)
+            position: Where the last read ended, or None for the start
+
+        Returns:
+            list: [array, position] of what was read and where it ended
+        """
+
+        name = key[0] if isinstance(key, tuple) else key
+        kind, source = self._sources[name]
+        if kind == 'csv':
+            data = None
+            if position is None and self.cache is not None:
+                # The same stat names the cached version and says where it
+                # ends, so rows appended in between are read next time
+                info = os.stat(source)
+                data = self.cache.get(source, info)
+                end = info.st_size
+            if data is None:
+                data, end = self._readCSV(source, 0 if position is None else position)
+                # Only whole files are cached, so a hit always ends at the end
+                if position is None and self.cache is not None and end == info.st_size:
+                    self.cache.put(source, data, info)
+            if isinstance(key, tuple):
+                data = data[:, 0 if key[1] == 'time' else 1 + FIELDS.index(key[1])]
+            return [data, end]
+
+        if position is None or position[0] != source.generation:
+            start = (0, 0)
+        else:
+            start = position[1]
+        end = (source.generation, source.position())
+        if isinstance(key, tuple):
+            data = source.massColumn(name, key[1], start)
+        else:
+            data = source.massData(name, start)
+        return [data, end]
+
+
+    def __getitem__(self, name):
+        entry = self._loaded.get(name)
+        if entry is None:
+            entry = self._read(name)
+            self._loaded[name] = entry
+        return entry[0]
+
+
+    def __contains__(self, name):
+        # Mapping's own check would read the mass
+        return name in self._sources
+
+
+    def __iter__(self):
+        return iter(self._sources)
+
+
+    def __len__(self):
+        return len(self._sources)
+
+
+    def column(self, name, field):
+        """
+        A function that returns one column of the data of a mass.
+
+        Parameters:
+            name (str): The name of the mass
+            field (str): 'time' or one of the saved fields
+
+        Returns:
+            ndarray: The column, one value per snapshot
+        """
+
+        if name in self._loaded:
+            return self[name][:, 0 if field == 'time' else 1 + FIELDS.index(field)]
+        entry = self._loaded.get((name, field))
+        if entry is None:
+            entry = self._read((name, field))
+            self._loaded[(name, field)] = entry
+        return entry[0]
+
+
+    def load(self, names=None, workers=None):
+        """
+        A function to read several masses at once.
+
+        Masses that have not been read yet are read on a pool of threads.
+
+        Parameters:
+            names (list): The names of the masses, or None for all of them
+            workers (int): The number of threads, or None for the default
+        """
+
+        if names is None:
+            names = list(self._sources)
+        missing = [name for name in names if name not in self._loaded]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for name, entry in zip(missing, pool.map(self._read, missing)):
+                self._loaded[name] = entry
+
+
+    def refresh(self):
+        """
+        A function to append whatever has been saved since the data was read.
+
+        Files must already have been refreshed (see TrajectoryReader.refresh()).
+        Arrays of files that were started again from scratch are read again.
+        """
+
+        for key, entry in self._loaded.items():
+            data, position = entry
+            name = key[0] if isinstance(key, tuple) else key
+            kind, source = self._sources[name]
+            if kind == 'nbt' and position[0] != source.generation:
+                self._loaded[key] = self._read(key)
+                continue
+            if kind == 'csv' and os.path.getsize(source) < position:
+                self._loaded[key] = self._read(key)
+                continue
+            new, end = self._read(key, position)
+            if len(new) > 0:
+                data = np.concatenate([data, new])
+            self._loaded[key] = [data, end]
+
 
 class Analyzer:
     
-    def __init__(self,path='',simulator=None,notebook=True):
+    def __init__(self,path='',simulator=None,notebook=True,cache=True,cacheSize=CACHE_SIZE):
         currentPath = ''
     
         if path != '':
@@ -29,37 +268,437 @@ class Analyzer:
             print("No path or simulator given.")
             return
         
-        if notebook:
-            output_notebook()
-            self.notebook = True
-        else:
-            self.notebook = False
+        # Bokeh is loaded by the first plot
+        self.notebook = notebook
+        self._plotLoaded = False
         
         self.path=currentPath
+        # Snapshots it has queued are written out before every read
+        self.simulator=simulator
+        
+        # Used for potential energies; the simulator's default unless given one
+        if simulator != None:
+            self.G = simulator.G
+        else:
+            self.G = 6.67259 * (10**-11)
+        
+        # Parsed .csv files are kept in a hidden folder of the run
+        if cache:
+            self.cache = ParseCache(currentPath+'.cache', cacheSize)
+        else:
+            self.cache = None
         
         self.colorOptions = [(255,0,0),(0,255,0),(0,0,255),(255,255,0),(255,0,255),(0,255,255),(255,255,255)]
         
         self.updateData()
     
     def updateData(self):
-        retData = {}
+        """
+        A function to find the saved masses in the folder, or catch up with
+        a run that is still being saved.
+
+        Nothing is read the first time: .nbt files are memory-mapped and .csv
+        files are only parsed the first time one of their masses is used, so
+        a run of any size opens straight away. Later calls only read what has
+        been written since the last one and append it to the arrays already
+        read, so a running simulation can be polled cheaply. Masses that
+        appear are added; masses that merge away keep the data saved for them,
+        but when a trajectory file has been started again from scratch, the
+        masses that are no longer in it are dropped. A mass saved both in a trajectory file and as a .csv file is read
+        from the trajectory file. When the Analyzer was given a simulator, the snapshots it is still
+        writing in the background are flushed to the file first.
+        """
+
+        if self.simulator != None:
+            self.simulator.flush()
+        if not hasattr(self,'massData'):
+            self.massData = MassData(self.cache)
+            self._readers = {}
     
-        for file in os.listdir(self.path):
+        # Trajectory files come first: a mass also exported with exportCSV()
+        # is read from its trajectory, which keeps growing while it runs
+        files = sorted(os.listdir(self.path))
+        for file in files:
+            fullPath = self.path+file
+            if file.endswith('.nbt'):
+                reader = self._readers.get(fullPath)
+                if reader is None:
+                    reader = TrajectoryReader(fullPath)
+                    self._readers[fullPath] = reader
+                else:
+                    generation = reader.generation
+                    reader.refresh()
+                    if reader.generation != generation:
+                        current = set(reader.names())
+                        for name in [n for n, (kind, source) in self.massData._sources.items()
+                                     if source is reader and n not in current]:
+                            self.massData.remove(name)
+                for name in reader.names():
+                    if name not in self.massData or self.massData._sources[name][0] == 'csv':
+                        self.massData.addTrajectory(name, reader)
+
+        for file in files:
             if file.endswith('.csv'):
-                fullPath = self.path+file
                 name = file[0:-4]
+                if name not in self.massData:
+                    self.massData.addCSV(name, self.path+file)
+        
+        self.massData.refresh()
+        
+    
+    def load(self,massNames=None,workers=None):
+        """
+        A function to read the data of several masses up front.
+
+        Masses are otherwise read the first time they are used. Here the ones
+        not read yet are read on a pool of threads, and any .csv files that
+        are not in the cache are parsed in parallel.
+
+        Parameters:
+            massNames (list): The names of the masses, or None for all of them
+            workers (int): The number of threads, or None for the default
+        """
+
+        self.massData.load(massNames,workers)
+        
+    
+    def getColumn(self,massName,attribute):
+        """
+        A function that returns the times and one attribute of a mass.
+
+        Only that attribute is read from a trajectory file.
+
+        Parameters:
+            massName (str): The name of the mass
+            attribute (str): 'time' or one of the saved fields, such as 'x'
+                             or 'x-velocity'
+
+        Returns:
+            tuple: (times, values), or None if the attribute is not recognized
+        """
+
+        field = attribute.lower()
+        if field != 'time' and field not in FIELDS:
+            print("attribute \"{}\" not recognized for mass \"{}\".".format(attribute,massName))
+            return None
+        return self.massData.column(massName,'time'), self.massData.column(massName,field)
+        
+
+    def stateAt(self,time,interpolate=False):
+        """
+        A function that returns the positions and velocities of every mass
+        that exists at a given time.
+
+        Snapshots are found by binary search: trajectory files keep an index
+        of their snapshot times, and the time column of a .csv mass is
+        searched on its own. Without interpolation the last snapshot at or
+        before the time is used. With it, positions and velocities are
+        interpolated between that snapshot and the next with cubic Hermite
+        curves, using the saved velocities and accelerations. Times outside
+        the run give its first or last snapshot.
+
+        Parameters:
+            time (double): The time
+            interpolate (bool): Whether to interpolate between snapshots
+
+        Returns:
+            tuple: (names, positions, velocities), the names of the masses
+                   and (N,3) arrays of their positions and velocities
+        """
+
+        fields = ('x','y','z','x-velocity','y-velocity','z-velocity')
+        names = []
+        values = []
+        
+        for reader in self._readers.values():
+            n, v = reader.state(time,fields,interpolate)
+            names += n
+            values.append(v)
+        
+        csvNames = [n for n in self.massData if self.massData._sources[n][0] == 'csv']
+        if len(csvNames) > 0:
+            starts = [self.massData[n][0,0] for n in csvNames if len(self.massData[n]) > 0]
+            ends = [self.massData[n][-1,0] for n in csvNames if len(self.massData[n]) > 0]
+            if len(starts) > 0:
+                t = min(max(time,min(starts)),max(ends))
+        for n in csvNames:
+            data = self.massData[n]
+            if len(data) == 0 or not data[0,0] <= t <= data[-1,0]:
+                continue
+            row = np.searchsorted(data[:,0],t,side='right')-1
+            state = data[row,3:9]
+            if interpolate and row+1 < len(data) and data[row,0] < t:
+                state = _interpolate(t,data[row,0],data[row+1,0],state,data[row+1,3:9],
+                                     data[row,6:12],data[row+1,6:12])
+            names.append(n)
+            values.append(state[np.newaxis,:])
+        
+        values = np.concatenate(values) if len(values) > 0 else np.zeros((0,6))
+        return names, values[:,0:3], values[:,3:6]
+        
+    
+    def _maxMasses(self):
+        """
+        A function used to find the most masses any snapshot can hold.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Returns:
+            int: The number of masses
+        """
+
+        return max([len(c.names) for r in self._readers.values() for c in r.chunks]+[len(self.massData)])
+        
+        
+    def _snapshotBlocks(self,fields,bytesPerSnapshot,chunkMemory):
+        """
+        A function used to walk through every snapshot of the run in blocks.
+
+        Trajectory files are read a block of records at a time. For .csv runs
+        the snapshots are the times saved for any mass, and each block is
+        assembled from the rows of every mass at those times.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            fields (tuple): The names of the fields to read
+            bytesPerSnapshot (int): How much memory one snapshot will take
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Yields:
+            tuple: (times, names, values, alive), the (T,) times of the block,
+                   the names of its masses, a (T,N,len(fields)) array of their
+                   fields, NaN where a mass does not exist or a field was not
+                   saved, and a (T,N) array of whether each mass exists
+        """
+
+        rows = max(1, int(chunkMemory // max(bytesPerSnapshot, 1)))
+        
+        if len(self._readers) > 0:
+            for reader in self._readers.values():
+                for chunk in reader.chunks:
+                    # Fields that were not saved are read from a column of NaN
+                    columns = [chunk.fields.index(f) if f in chunk.fields else len(chunk.fields)
+                               for f in fields]
+                    # As in TrajectoryReader, a mass exists where its first saved field is set
+                    exists = chunk.fields.index('mass') if 'mass' in chunk.fields else 0
+                    for start in range(0, len(chunk.times), rows):
+                        stop = min(start+rows, len(chunk.times))
+                        values = np.asarray(chunk.values[start:stop], dtype=np.float64)
+                        alive = ~np.isnan(values[:,:,exists])
+                        values = np.concatenate([values,np.full(values.shape[:2]+(1,),np.nan)],axis=2)
+                        yield np.asarray(chunk.times[start:stop]), chunk.names, values[:,:,columns], alive
+            return
+        
+        names = list(self.massData)
+        if len(names) == 0:
+            return
+        columns = [1+FIELDS.index(f) for f in fields]
+        times = np.unique(np.concatenate([self.massData[n][:,0] for n in names]))
+        for start in range(0, len(times), rows):
+            block = times[start:start+rows]
+            values = np.full((len(block),len(names),len(fields)),np.nan)
+            alive = np.zeros((len(block),len(names)),dtype=bool)
+            for k,n in enumerate(names):
+                data = self.massData[n]
+                at = np.searchsorted(block,data[:,0])
+                found = at < len(block)
+                found[found] = block[at[found]] == data[found,0]
+                values[at[found],k] = data[found][:,columns]
+                alive[at[found],k] = True
+            yield block, names, values, alive
             
-                data = []
-                with open(fullPath,'r') as f:
-                    fullData = list(csv.reader(f))
-                    data = np.array(fullData[1:]).astype(np.float)
-                
-                retData.update({name:data})
+            
+    def energy(self,G=None,chunkMemory=CHUNK_MEMORY):
+        """
+        A function that returns the total energy of the system in every snapshot.
+
+        The kinetic energy of every mass and the potential energy of every
+        pair are summed for whole blocks of snapshots at once, the same way
+        as Simulator.getEnergy(). Systems with too many pairs for a block to
+        fit in chunkMemory are summed one snapshot at a time instead. The
+        energy is NaN in snapshots where the masses, positions or velocities
+        were not saved.
+
+        Parameters:
+            G (double): Newton's gravitational constant, or None for self.G
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Returns:
+            tuple: (times, energies), two (T,) arrays
+        """
+
+        if G == None:
+            G = self.G
+        fields = ('mass','x','y','z','x-velocity','y-velocity','z-velocity')
+        times = []
+        energies = []
+        
+        n = self._maxMasses()
+        pairBytes = 4 * 8 * n * (n-1) // 2
+        batched = pairBytes <= chunkMemory
+        
+        for t, names, values, alive in self._snapshotBlocks(fields,pairBytes if batched else 8*7*n,
+                                                            chunkMemory):
+            values = np.where(alive[:,:,np.newaxis],values,0)
+            m = values[:,:,0]
+            pos = values[:,:,1:4]
+            vel = values[:,:,4:7]
+            kinetic = 0.5 * np.sum(m * np.einsum('tij,tij->ti',vel,vel),axis=1)
+            
+            if batched:
+                i,j = np.triu_indices(len(names),1)
+                d = pos[:,i,:] - pos[:,j,:]
+                r = np.sqrt(np.einsum('tpk,tpk->tp',d,d))
+                pair = alive[:,i] & alive[:,j]
+                potential = -G * np.sum(np.where(pair, m[:,i]*m[:,j] / np.where(pair,r,1), 0),axis=1)
+            else:
+                potential = np.array([potentialEnergy(pos[k][alive[k]],m[k][alive[k]],G,chunkMemory)
+                                      for k in range(len(t))])
+            times.append(t)
+            energies.append(kinetic+potential)
+        
+        if len(times) == 0:
+            return np.zeros(0), np.zeros(0)
+        return np.concatenate(times), np.concatenate(energies)
+        
         
-        self.massData = retData
+    def _weightedSums(self,chunkMemory):
+        """
+        A function used to sum the mass, momentum, angular momentum and mass
+        weighted position of the system in every snapshot.
+
+        Masses that do not exist count as nothing, but fields that were not
+        saved for masses that do make the sums that need them NaN.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Returns:
+            tuple: (times, mass, momentum, angular momentum, mass times position)
+        """
+
+        fields = ('mass','x','y','z','x-velocity','y-velocity','z-velocity')
+        parts = []
+        n = self._maxMasses()
+        for t, names, values, alive in self._snapshotBlocks(fields,3*8*7*n,chunkMemory):
+            values = np.where(alive[:,:,np.newaxis],values,0)
+            m = values[:,:,0:1]
+            pos = values[:,:,1:4]
+            mv = m * values[:,:,4:7]
+            parts.append((t, np.sum(m[:,:,0],axis=1), np.sum(mv,axis=1),
+                          np.sum(np.cross(pos,mv),axis=1), np.sum(m*pos,axis=1)))
+        if len(parts) == 0:
+            return np.zeros(0), np.zeros(0), np.zeros((0,3)), np.zeros((0,3)), np.zeros((0,3))
+        return tuple(np.concatenate(p) for p in zip(*parts))
+        
+        
+    def momentum(self,chunkMemory=CHUNK_MEMORY):
+        """
+        A function that returns the total linear momentum in every snapshot.
+
+        Parameters:
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Returns:
+            tuple: (times, momenta), a (T,) and a (T,3) array
+        """
+
+        sums = self._weightedSums(chunkMemory)
+        return sums[0], sums[2]
+        
+        
+    def angularMomentum(self,chunkMemory=CHUNK_MEMORY):
+        """
+        A function that returns the total angular momentum about the origin
+        in every snapshot.
+
+        Parameters:
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Returns:
+            tuple: (times, angular momenta), a (T,) and a (T,3) array
+        """
+
+        sums = self._weightedSums(chunkMemory)
+        return sums[0], sums[3]
+        
+        
+    def centerOfMass(self,chunkMemory=CHUNK_MEMORY):
+        """
+        A function that returns the centre of mass of the system in every snapshot.
+
+        Parameters:
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Returns:
+            tuple: (times, positions), a (T,) and a (T,3) array
+        """
+
+        sums = self._weightedSums(chunkMemory)
+        return sums[0], sums[4] / sums[1][:,np.newaxis]
+        
+        
+    def separation(self,pairs,chunkMemory=CHUNK_MEMORY):
+        """
+        A function that returns the distances between pairs of masses in
+        every snapshot.
+
+        Parameters:
+            pairs (list): A list of (name, name) tuples, or a single one
+            chunkMemory (int): The maximum size in bytes of a block
+
+        Returns:
+            tuple: (times, distances), a (T,) and a (T,len(pairs)) array,
+                   with NaN where either mass of a pair does not exist
+        """
+
+        if isinstance(pairs[0],str):
+            pairs = [pairs]
+        n = self._maxMasses()
+        times = []
+        distances = []
+        for t, names, values, alive in self._snapshotBlocks(('x','y','z'),8*3*n+8*len(pairs),
+                                                            chunkMemory):
+            slots = {name:k for k,name in enumerate(names)}
+            out = np.full((len(t),len(pairs)),np.nan)
+            for k,(a,b) in enumerate(pairs):
+                if a in slots and b in slots:
+                    d = values[:,slots[a]] - values[:,slots[b]]
+                    out[:,k] = np.sqrt(np.einsum('ij,ij->i',d,d))
+            times.append(t)
+            distances.append(out)
+        if len(times) == 0:
+            return np.zeros(0), np.zeros((0,len(pairs)))
+        return np.concatenate(times), np.concatenate(distances)
         
     
-    def plot(self,massName,attribute,height=600,width=600):
+    def plot(self,massName,attribute,height=600,width=600,decimation='minmax',live=False,
+             notebookUrl='localhost:8888'):
+        """
+        A function to plot attributes of masses against time.
+
+        Long runs are not sent to the plot in full: every line is shrunk to
+        about one point per pixel of the plot's width, keeping its shape (see
+        decimate.py). When the plot is live, zooming or panning shrinks the
+        visible window again from the full data, so the detail of any window
+        can be seen. Live plots need the Bokeh server, which show() starts
+        inside a notebook; otherwise the plot is a static page.
+
+        Parameters:
+            massName (str or list): The name of a mass, or a list of them
+            attribute (str or list): The attribute to plot for each mass
+            height (int): The height of the plot in pixels
+            width (int): The width of the plot in pixels
+            decimation (str): 'minmax' or 'lttb', or None to plot every point
+            live (bool): Whether to decimate again on zoom, which needs a
+                         notebook
+            notebookUrl (str): The address of the notebook server, for live
+                               plots
+
+        Returns:
+            figure: The Bokeh figure
+        """
         
         if isinstance(massName,str):
             massName = [massName]
@@ -69,64 +708,55 @@ class Analyzer:
             print("Lists are of different sizes.")
             return
         
+        live = live and self.notebook and decimation != None
+        
+        from bokeh.io import show, output_notebook
+        from bokeh.plotting import figure
+        from bokeh.models import ColumnDataSource
+        from bokeh.events import RangesUpdate
+        if self.notebook and not self._plotLoaded:
+            output_notebook()
+        self._plotLoaded = True
+        
         time = []
         yvals = []
         
         for i in range(0,len(massName)):
-            n = massName[i]
-            a = attribute[i]
-            time.append(self.massData[n][:,0])
-            
-            if a.lower() == 'mass':
-                yvals.append(self.massData[n][:,1])
-            elif a.lower() == 'radius':
-                yvals.append(self.massData[n][:,2])
-            elif a.lower() == 'x':
-                yvals.append(self.massData[n][:,3])
-            elif a.lower() == 'y':
-                yvals.append(self.massData[n][:,4])
-            elif a.lower() == 'z':
-                yvals.append(self.massData[n][:,5])
-                
-            elif a.lower() == 'x-velocity':
-                yvals.append(self.massData[n][:,6])
-            elif a.lower() == 'y-velocity':
-                yvals.append(self.massData[n][:,7])
-            elif a.lower() == 'z-velocity':
-                yvals.append(self.massData[n][:,8])
-                
-            elif a.lower() == 'x-acceleration':
-                yvals.append(self.massData[n][:,9])
-            elif a.lower() == 'y-acceleration':
-                yvals.append(self.massData[n][:,10])
-            elif a.lower() == 'z-acceleration':
-                yvals.append(self.massData[n][:,11])
-                
-            elif a.lower() == 'x-force':
-                yvals.append(self.massData[n][:,12])
-            elif a.lower() == 'y-force':
-                yvals.append(self.massData[n][:,13])
-            elif a.lower() == 'z-force':
-                yvals.append(self.massData[n][:,14])
-                
-            else:
-                print("attribute \"{}\" not recognized for mass \"{}\".".format(a,n))
+            column = self.getColumn(massName[i],attribute[i])
+            if column is None:
                 return
+            time.append(column[0])
+            yvals.append(column[1])
             
-        xrange=(min([min(i) for i in time]),max([max(i) for i in time]))
-        yrange=(min([min(i) for i in yvals]),max([max(i) for i in yvals]))
+        xrange=(min([np.min(i) for i in time]),max([np.max(i) for i in time]))
+        yrange=(min([np.min(i) for i in yvals]),max([np.max(i) for i in yvals]))
        
         TOOLS="hover,crosshair,pan,box_zoom,wheel_zoom,zoom_in,zoom_out,reset,save"
     
-        fig = figure(plot_height=height,plot_width=width,x_range=xrange,y_range=yrange,tools=TOOLS)
+        fig = figure(height=height,width=width,x_range=xrange,y_range=yrange,tools=TOOLS)
         
+        sources = []
         for i in range(0,len(yvals)):
             linecolor = self.colorOptions[i%7]
             
-            fig.line(time[i],yvals[i],legend_label=massName[i]+': '+attribute[i],
+            x, y = time[i], yvals[i]
+            if decimation != None:
+                x, y = decimate(x,y,width,decimation)
+            sources.append(ColumnDataSource(data={'x':x,'y':y}))
+            fig.line('x','y',source=sources[i],legend_label=massName[i]+': '+attribute[i],
                      line_color=linecolor)
+        
+        if live:
+            # Sent once per zoom or pan, once the ranges have settled
+            def redecimate(event):
+                for i in range(0,len(sources)):
+                    x, y = decimate(time[i],yvals[i],width,decimation,event.x0,event.x1)
+                    sources[i].data = {'x':x,'y':y}
             
-        show(fig)
+            fig.on_event(RangesUpdate,redecimate)
+            show(lambda doc: doc.add_root(fig),notebook_url=notebookUrl)
+        else:
+            show(fig)
         return fig    
                 
     
\ No newline at end of file
@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .simulator import Simulator
+from .forces import directAccelerations
+from .parallel import parallelAccelerations
+from .kernels import haveNumba
+
+# Direct-sum solvers are skipped above this many pairs per step
+MAX_DIRECT_PAIRS = 10 ** 9
+
+# Where the command line keeps the baseline it compares with
+BASELINE_PATH = 'benchmark-baseline.json'
+
+
+def _orbitSystem():
+    """
+    A function used to build the system the integrators are compared on.
+
+    A unit mass star with an eccentric (e=0.5) planet and a lighter outer
+    planet, in units where G=1 so one inner orbit takes about 2*pi.
+    (Note: it is not recommended that you use this function directly.)
+
+    Returns:
+        Simulator: The system, ready to step
+    """
+
+    sim = Simulator(name='integrator-comparison', notebook=False)
+    sim.G = 1
+    # The inner planet starts at pericenter, a(1-e) from the star
+    sim.addMass('star', 1, 1e-6, 0, 0, 0, 0, 0, 0)
+    sim.addMass('inner', 1e-3, 1e-6, 0.5, 0, 0, 0, np.sqrt(1.001 * 3), 0)
+    sim.addMass('outer', 1e-4, 1e-6, -3, 0, 0, 0, -np.sqrt(1.0011 / 3), 0)
+    return sim
+
+
+def compareIntegrators(integrators=('euler', 'leapfrog', 'yoshida4', 'rk45'),
+                       dts=(0.1, 0.03, 0.01, 0.003), duration=20 * np.pi):
+    """
+    A function to compare the energy drift and speed of the integrators.
+
+    Every integrator is run on the same three body system for the same length
+    of simulation time with every step size in dts. For 'rk45' the step size
+    is only how often it reports back, its own error control picks the
+    substeps. The relative energy error at the end and the wall time of every
+    run are printed in a table and returned.
+
+    Parameters:
+        integrators (tuple): The names of the integrators to compare
+        dts (tuple): The step sizes to run every integrator with
+        duration (double): The length of simulation time of every run
+
+    Returns:
+        list: A dict for every run with the keys 'integrator', 'dt',
+              'energyError' and 'wallTime'
+    """
+
+    results = []
+    print('{:>10} {:>8} {:>14} {:>10}'.format('integrator', 'dt', 'energy error', 'time (s)'))
+    for name in integrators:
+        for dt in dts:
+            sim = _orbitSystem()
+            sim.setIntegrator(name)
+            startEnergy = sim.getEnergy()
+            numSteps = int(round(duration / dt))
+
+            start = time.perf_counter()
+            sim.step(dt, numSteps)
+            wallTime = time.perf_counter() - start
+
+            energyError = abs((sim.getEnergy() - startEnergy) / startEnergy)
+            results.append({'integrator': name, 'dt': dt,
+                            'energyError': energyError, 'wallTime': wallTime})
+            print('{:>10} {:>8g} {:>14.3e} {:>10.3f}'.format(name, dt, energyError, wallTime))
+    return results
+
+
+def parallelScaling(N=8000, workers=(1, 2, 4, 8, 16, 32), repeats=3):
+    """
+    A function to measure how the parallel solver scales with worker count.
+
+    The accelerations of N randomly placed masses are calculated with the
+    serial direct sum and with the parallel solver for every number of
+    workers. The best of repeats runs is timed, after one untimed run that
+    starts the pool. Every parallel result is checked to be identical to the
+    serial one. The timings are printed in a table and returned.
+
+    Parameters:
+        N (int): The number of masses
+        workers (tuple): The numbers of worker processes to try
+        repeats (int): The number of timed runs of each
+
+    Returns:
+        list: A dict for every run with the keys 'workers', 'wallTime',
+              'speedup' and 'identical' (workers is 0 for the serial run)
+    """
+
+    rng = np.random.default_rng(0)
+    positions = rng.normal(size=(N, 3))
+    masses = rng.uniform(1, 2, N)
+
+    def best(solve):
+        solve()
+        times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            result = solve()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    serialTime, serial = best(lambda: directAccelerations(positions, masses, 1.0))
+    results = [{'workers': 0, 'wallTime': serialTime, 'speedup': 1.0, 'identical': True}]
+    print('{:>8} {:>10} {:>8} {:>10}'.format('workers', 'time (s)', 'speedup', 'identical'))
+    print('{:>8} {:>10.3f} {:>8.2f} {:>10}'.format('serial', serialTime, 1.0, 'yes'))
+    for w in workers:
+        wallTime, parallel = best(lambda: parallelAccelerations(positions, masses, 1.0, w))
+        identical = bool(np.array_equal(serial, parallel))
+        results.append({'workers': w, 'wallTime': wallTime,
+                        'speedup': serialTime / wallTime, 'identical': identical})
+        print('{:>8} {:>10.3f} {:>8.2f} {:>10}'.format(w, wallTime, serialTime / wallTime,
+                                                       'yes' if identical else 'NO'))
+    return results
+
+
+def _clusterSystem(N, collisions, path, seed=0):
+    """
+    A function used to build the systems stepThroughput() times.
+
+    N equal masses, adding up to 1, are spread through a unit Gaussian blob
+    with G=1 and given random velocities of about 1. In the collision heavy
+    version every mass has a radius of about a quarter of the typical
+    spacing, so masses keep running into each other; otherwise the radii
+    are tiny.
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        N (int): The number of masses
+        collisions (bool): Whether to make the collision heavy version
+        path (str): The folder saved runs go in
+        seed (int): The seed of the random positions
+
+    Returns:
+        Simulator: The system, ready to step
+    """
+
+    rng = np.random.default_rng(seed)
+    sim = Simulator(name='benchmark', path=path, notebook=False)
+    sim.G = 1
+    radius = N ** (-1 / 3) if collisions else 1e-9
+    state = rng.normal(size=(N, 6))
+    sim.addMasses('m', 1 / N, radius, state[:, :3], state[:, 3:])
+    return sim
+
+
+def stepThroughput(sizes=(10, 100, 1000, 10000, 100000),
+                   solvers=('direct', 'barneshut', 'particlemesh', 'parallel'),
+                   integrators=('leapfrog',), collisions=(False, True), saves=(False, True),
+                   dt=1e-3, budget=2.0):
+    """
+    A function to measure how many steps per second Simulator.step() runs.
+
+    Every combination of the number of masses, the solver, the integrator,
+    collision free or collision heavy systems (see _clusterSystem()) and
+    saving on or off is timed. One untimed step warms every run up (starting
+    worker pools and compiling kernels), then as many steps as fit in about
+    budget seconds (judged from one more step) are timed, including writing
+    out anything saved. Direct
+    sums with more than MAX_DIRECT_PAIRS pairs are skipped. The results are
+    printed in a table and returned.
+
+    Parameters:
+        sizes (tuple): The numbers of masses
+        solvers (tuple): The names of the solvers
+        integrators (tuple): The names of the integrators
+        collisions (tuple): Whether each case is collision heavy
+        saves (tuple): Whether each case saves every step
+        dt (double): The timestep
+        budget (double): Roughly how many seconds to time each case for
+
+    Returns:
+        list: A dict for every case with the keys 'N', 'solver',
+              'integrator', 'collisions', 'save', 'steps', 'wallTime',
+              'stepsPerSecond' and 'finalN' ('steps' is 0 when skipped)
+    """
+
+    results = []
+    print('{:>7} {:>12} {:>9} {:>10} {:>5} {:>7} {:>10} {:>8}'.format(
+        'N', 'solver', 'integ.', 'collisions', 'save', 'steps', 'steps/s', 'final N'))
+    with tempfile.TemporaryDirectory() as folder:
+        for N in sizes:
+            for solver in solvers:
+                for integrator in integrators:
+                    for collide in collisions:
+                        for save in saves:
+                            case = {'N': N, 'solver': solver, 'integrator': integrator,
+                                    'collisions': collide, 'save': save}
+                            if solver in ('direct', 'parallel') and N * N > MAX_DIRECT_PAIRS:
+                                case.update(steps=0, wallTime=0.0, stepsPerSecond=0.0, finalN=N)
+                            else:
+                                case.update(_timeSteps(N, solver, integrator, collide, save,
+                                                       dt, budget, folder))
+                            results.append(case)
+                            print('{:>7} {:>12} {:>9} {:>10} {:>5} {:>7} {:>10.4g} {:>8}'.format(
+                                N, solver, integrator, 'yes' if collide else 'no',
+                                'yes' if save else 'no', case['steps'] or 'skipped',
+                                case['stepsPerSecond'], case['finalN']))
+    return results
+
+
+def _timeSteps(N, solver, integrator, collisions, save, dt, budget, folder):
+    """
+    A function used to time one case of stepThroughput().
+
+    (Note: it is not recommended that you use this function directly.)
+
+    Returns:
+        dict: The 'steps', 'wallTime', 'stepsPerSecond' and 'finalN' of the case
+    """
+
+    sim = _clusterSystem(N, collisions, folder)
+    sim.setSolver(solver)
+    sim.setIntegrator(integrator)
+    if save:
+        # step() otherwise only saves once at the end of every call
+        sim.setOutput(everySteps=1)
+
+    sim.step(dt, 1, save)
+    start = time.perf_counter()
+    sim.step(dt, 1, save)
+    sim.flush()
+    single = time.perf_counter() - start
+    numSteps = int(max(1, min(1000, budget / max(single, 1e-6))))
+
+    start = time.perf_counter()
+    sim.step(dt, numSteps, save)
+    sim.flush()
+    wallTime = time.perf_counter() - start
+    sim.close()
+    if os.path.exists(sim.getTrajectoryPath()):
+        os.remove(sim.getTrajectoryPath())
+
+    return {'steps': numSteps, 'wallTime': wallTime,
+            'stepsPerSecond': numSteps / wallTime, 'finalN': len(sim.massList)}
+
+
+def _caseKey(case):
+    """
+    A function used to match the cases of two benchmark runs.
+
+    (Note: it is not recommended that you use this function directly.)
+    """
+
+    return (case['N'], case['solver'], case['integrator'], case['collisions'], case['save'])
+
+
+def compareBaseline(results, baseline, tolerance=0.25):
+    """
+    A function to find the cases that have slowed down since a baseline.
+
+    A case has regressed when its steps per second are below the baseline's
+    by more than the tolerance. Cases missing from either run, or skipped,
+    are ignored. The changes are printed in a table.
+
+    Parameters:
+        results (list): The results of stepThroughput()
+        baseline (list): Earlier results of stepThroughput()
+        tolerance (double): The fraction slower a case may be
+
+    Returns:
+        list: The cases that regressed, with the baseline 'baselineStepsPerSecond'
+    """
+
+    old = {_caseKey(case): case for case in baseline}
+    regressions = []
+    print('{:>7} {:>12} {:>9} {:>10} {:>5} {:>10} {:>10} {:>8}'.format(
+        'N', 'solver', 'integ.', 'collisions', 'save', 'baseline', 'now', 'change'))
+    for case in results:
+        before = old.get(_caseKey(case))
+        if before == None or case['steps'] == 0 or before['steps'] == 0:
+            continue
+        change = case['stepsPerSecond'] / before['stepsPerSecond'] - 1
+        slower = change < -tolerance
+        if slower:
+            regressions.append(dict(case, baselineStepsPerSecond=before['stepsPerSecond']))
+        print('{:>7} {:>12} {:>9} {:>10} {:>5} {:>10.4g} {:>10.4g} {:>+7.0%}{}'.format(
+            case['N'], case['solver'], case['integrator'], 'yes' if case['collisions'] else 'no',
+            'yes' if case['save'] else 'no', before['stepsPerSecond'], case['stepsPerSecond'],
+            change, ' SLOWER' if slower else ''))
+    return regressions
+
+
+def main(argv=None):
+    """
+    The command line entry point, run with python -m nbodysim.benchmarks.
+
+    Runs stepThroughput() over the chosen grid and writes the results, with
+    a description of the machine, to a JSON file. With --write-baseline the
+    results are also kept as the baseline (BASELINE_PATH, or the file given
+    with --baseline). Otherwise, if the baseline exists, the results are
+    compared to it and the exit status is 1 if any case is slower than the
+    tolerance allows. Baselines are only meaningful on the machine they were
+    made on, so none is shipped.
+
+    Parameters:
+        argv (list): The command line arguments, by default sys.argv[1:]
+
+    Returns:
+        int: The exit status
+    """
+
+    parser = argparse.ArgumentParser(prog='python -m nbodysim.benchmarks',
+                                     description='Time Simulator.step() over a grid of cases.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--solvers', nargs='+',
+                        default=['direct', 'barneshut', 'particlemesh', 'parallel'])
+    parser.add_argument('--integrators', nargs='+', default=['leapfrog'])
+    parser.add_argument('--collisions', choices=['off', 'on', 'both'], default='both')
+    parser.add_argument('--save', choices=['off', 'on', 'both'], default='both')
+    parser.add_argument('--dt', type=float, default=1e-3)
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help='roughly how many seconds to time each case for')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help='the baseline file to compare with, or to write')
+    parser.add_argument('--write-baseline', action='store_true',
+                        help='keep these results as the baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the fraction slower a case may be than the baseline')
+    args = parser.parse_args(argv)
+
+    choices = {'off': (False,), 'on': (True,), 'both': (False, True)}
+    results = stepThroughput(args.sizes, args.solvers, args.integrators,
+                             choices[args.collisions], choices[args.save], args.dt, args.budget)
+    machine = {'platform': platform.platform(), 'python': platform.python_version(),
+               'numpy': np.__version__, 'numba': haveNumba(), 'cpus': os.cpu_count()}
+    outputs = [args.output] + ([args.baseline] if args.write_baseline else [])
+    for path in outputs:
+        with open(path, 'w') as f:
+            json.dump({'machine': machine, 'results': results}, f, indent=1)
+        print('Results written to {}'.format(path))
+    if args.write_baseline:
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}, make one with --write-baseline.'.format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compareBaseline(results, baseline, args.tolerance)
+    if regressions:
+        print('{} case(s) slower than the baseline.'.format(len(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
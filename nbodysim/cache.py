@@ -0,0 +1,156 @@
+import os
+
+import numpy as np
+
+# The default limit on the size of a cache folder, in bytes
+CACHE_SIZE = 512 * 2 ** 20
+
+
+class ParseCache:
+    """
+    A folder of parsed arrays, saved as .npy files next to the files they
+    were parsed from.
+
+    Every array is stored under the name of its source file along with the
+    source's size and modification time, so an array is only used while its
+    source is unchanged. Reading an array marks it as recently used, and when
+    the folder grows beyond maxBytes the arrays used longest ago are deleted.
+    The cache is only a shortcut: if the folder cannot be written, as in a
+    read-only or shared data directory, arrays are simply not cached.
+
+    Attributes:
+        folder (str): The folder the arrays are kept in
+        maxBytes (int): The largest the folder may grow to, in bytes
+    """
+
+    def __init__(self, folder, maxBytes=CACHE_SIZE):
+        """
+        A constructor for a ParseCache
+
+        Parameters:
+            folder (str): The folder the arrays are kept in
+            maxBytes (int): The largest the folder may grow to, in bytes
+        """
+
+        self.folder = folder
+        self.maxBytes = maxBytes
+
+
+    def _key(self, path, info=None):
+        """
+        A function used to find the cache file of a source file as it is now.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            path (str): The source file
+            info (stat_result): The os.stat() of the source, or None to take it now
+
+        Returns:
+            tuple: (prefix, file), the start shared by every version of the
+                   source's cache file and the cache file of this version
+        """
+
+        if info is None:
+            info = os.stat(path)
+        prefix = os.path.basename(path) + '.'
+        return prefix, os.path.join(self.folder, '{}{}.{}.npy'.format(
+            prefix, info.st_size, info.st_mtime_ns))
+
+
+    def get(self, path, info=None):
+        """
+        A function that returns the cached array of a source file.
+
+        Parameters:
+            path (str): The source file
+            info (stat_result): The os.stat() of the source, so the caller
+                                knows which version the array is of, or None
+
+        Returns:
+            ndarray: The array, memory-mapped, or None if it is not cached or
+                     the source has changed since
+        """
+
+        prefix, file = self._key(path, info)
+        try:
+            data = np.load(file, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(file)
+        except OSError:
+            pass
+        return data
+
+
+    def put(self, path, data, info=None):
+        """
+        A function to cache the array parsed from a source file.
+
+        Older versions of the same source are deleted, and then the arrays
+        used longest ago until the folder fits in maxBytes again. Nothing is
+        cached if the folder cannot be written.
+
+        Parameters:
+            path (str): The source file
+            data (ndarray): The parsed array
+            info (stat_result): The os.stat() of the version that was
+                                parsed, or None to take it now
+        """
+
+        prefix, file = self._key(path, info)
+        if data.nbytes > self.maxBytes:
+            return
+        temp = file + '.tmp'
+        try:
+            if not os.path.exists(self.folder):
+                os.makedirs(self.folder)
+            for old in os.listdir(self.folder):
+                if old.startswith(prefix) and old.count('.') == prefix.count('.') + 2:
+                    os.remove(os.path.join(self.folder, old))
+
+            # Written under another name first so a reader never sees half an array
+            with open(temp, 'wb') as f:
+                np.save(f, data)
+            os.replace(temp, file)
+            self.evict()
+        except OSError:
+            if os.path.exists(temp):
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+
+
+    def evict(self):
+        """
+        A function to delete the arrays used longest ago until the folder
+        fits in maxBytes.
+        """
+
+        if not os.path.exists(self.folder):
+            return
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.npy'):
+                info = os.stat(os.path.join(self.folder, name))
+                entries.append((info.st_mtime_ns, info.st_size, name))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.maxBytes:
+                break
+            os.remove(os.path.join(self.folder, name))
+            total -= size
+
+
+    def clear(self):
+        """
+        A function to delete every cached array.
+        """
+
+        if os.path.exists(self.folder):
+            for name in os.listdir(self.folder):
+                if name.endswith('.npy') or name.endswith('.tmp'):
+                    os.remove(os.path.join(self.folder, name))
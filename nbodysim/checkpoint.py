@@ -0,0 +1,50 @@
+import json
+import os
+
+import numpy as np
+
+
+def writeCheckpoint(path, info, arrays):
+    """
+    A function to write a checkpoint file.
+
+    A checkpoint is an uncompressed NumPy .npz archive holding the arrays,
+    plus the info dictionary as JSON. It is written to a temporary file next
+    to path, flushed to disk and only then renamed over path, so a crash
+    while writing never damages the last good checkpoint.
+
+    Parameters:
+        path (str): The checkpoint file
+        info (dict): Everything that is not an array, which must be
+                     serializable as JSON
+        arrays (dict): The arrays to save, by name
+    """
+
+    folder = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    text = np.frombuffer(json.dumps(info).encode('utf-8'), dtype=np.uint8)
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        np.savez(f, info=text, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def readCheckpoint(path):
+    """
+    A function to read a checkpoint file written by writeCheckpoint().
+
+    Parameters:
+        path (str): The checkpoint file
+
+    Returns:
+        tuple: (info, arrays), the dictionary and the arrays that were saved
+    """
+
+    with np.load(path, allow_pickle=False) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    info = json.loads(arrays.pop('info').tobytes().decode('utf-8'))
+    return info, arrays
@@ -0,0 +1,64 @@
+import numba
+import numpy as np
+
+# The compiled loops behind kernels.py. This module imports Numba, so it is
+# only imported the first time one of the loops is used.
+
+
+@numba.njit(parallel=True, cache=True)
+def accelerationKernel(positions, masses, G, targets, out):
+    """
+    The compiled loop behind jitAccelerations().
+    """
+
+    N = positions.shape[0]
+    for k in numba.prange(targets.shape[0]):
+        i = targets[k]
+        xi = positions[i, 0]
+        yi = positions[i, 1]
+        zi = positions[i, 2]
+        ax = 0.0
+        ay = 0.0
+        az = 0.0
+        for j in range(N):
+            if j == i:
+                continue
+            dx = positions[j, 0] - xi
+            dy = positions[j, 1] - yi
+            dz = positions[j, 2] - zi
+            r2 = dx * dx + dy * dy + dz * dz
+            weight = masses[j] / (r2 * np.sqrt(r2))
+            ax += weight * dx
+            ay += weight * dy
+            az += weight * dz
+        out[k, 0] = G * ax
+        out[k, 1] = G * ay
+        out[k, 2] = G * az
+
+
+@numba.njit(cache=True)
+def overlapKernel(positions, reach, order, lo, hi, fill, outI, outJ):
+    """
+    The compiled sweep behind jitOverlappingPairs().
+
+    When fill is False the pairs are only counted, so the output arrays
+    can be allocated to the right size for a second, filling pass.
+    """
+
+    N = order.shape[0]
+    count = 0
+    for k in range(N):
+        a = order[k]
+        for m in range(k + 1, N):
+            b = order[m]
+            if lo[b] > hi[a]:
+                break
+            dx = positions[a, 0] - positions[b, 0]
+            dy = positions[a, 1] - positions[b, 1]
+            dz = positions[a, 2] - positions[b, 2]
+            if np.sqrt(dx * dx + dy * dy + dz * dz) <= reach[a] + reach[b]:
+                if fill:
+                    outI[count] = max(a, b)
+                    outJ[count] = min(a, b)
+                count += 1
+    return count
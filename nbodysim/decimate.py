@@ -0,0 +1,146 @@
+import numpy as np
+
+
+def minMax(x, y, buckets):
+    """
+    A function to shrink a time series to the smallest and largest value of
+    every bucket.
+
+    The points are split into buckets of equal length along x, and only the
+    lowest and highest point of each bucket are kept, in their original
+    order. With one bucket per pixel of the plot, the line drawn looks the
+    same as the full series, spikes included.
+
+    Parameters:
+        x (ndarray): The (T,) x values, in increasing order
+        y (ndarray): The (T,) y values
+        buckets (int): The number of buckets
+
+    Returns:
+        tuple: (x, y), the at most 2*buckets points kept
+    """
+
+    T = len(x)
+    if T <= 2 * buckets:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], buckets + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1], side='left'))
+    # Every bucket that starts at a point is reduced on its own
+    lowest = np.minimum.reduceat(y, starts)
+    highest = np.maximum.reduceat(y, starts)
+    which = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, T)))
+    isLow = y == lowest[which]
+    isHigh = y == highest[which]
+
+    # The first lowest and the first highest point of every bucket
+    lowIndex = np.flatnonzero(isLow)
+    lowIndex = lowIndex[np.r_[True, which[lowIndex[1:]] != which[lowIndex[:-1]]]]
+    highIndex = np.flatnonzero(isHigh)
+    highIndex = highIndex[np.r_[True, which[highIndex[1:]] != which[highIndex[:-1]]]]
+
+    keep = np.unique(np.concatenate([lowIndex, highIndex, [0, T - 1]]))
+    return x[keep], y[keep]
+
+
+def lttb(x, y, threshold):
+    """
+    A function to shrink a time series with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept, and the rest are split into
+    threshold-2 buckets. From every bucket the point forming the largest
+    triangle with the point kept from the bucket before and the average of
+    the bucket after is kept, which follows the visual shape of the series
+    closely with a single point per bucket.
+
+    Parameters:
+        x (ndarray): The (T,) x values, in increasing order
+        y (ndarray): The (T,) y values
+        threshold (int): The number of points to keep
+
+    Returns:
+        tuple: (x, y), the points kept
+    """
+
+    T = len(x)
+    if threshold >= T or threshold < 3:
+        return x, y
+
+    edges = np.floor(np.linspace(1, T - 1, threshold - 1)).astype(np.int64)
+    # The average of every bucket, for the bucket before it
+    meanX = np.add.reduceat(x[:T - 1], edges[:-1]) / np.diff(edges)
+    meanY = np.add.reduceat(y[:T - 1], edges[:-1]) / np.diff(edges)
+    meanX = np.append(meanX, x[-1])
+    meanY = np.append(meanY, y[-1])
+
+    keep = np.zeros(threshold, dtype=np.int64)
+    keep[-1] = T - 1
+    a = 0
+    for k in range(threshold - 2):
+        lo, hi = edges[k], edges[k + 1]
+        area = np.abs((x[a] - meanX[k + 1]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (meanY[k + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[k + 1] = a
+    return x[keep], y[keep]
+
+
+def decimate(x, y, width, method='minmax', start=None, end=None):
+    """
+    A function to shrink the part of a time series between two x values to
+    about one point per pixel.
+
+    Parameters:
+        x (ndarray): The (T,) x values, in increasing order
+        y (ndarray): The (T,) y values
+        width (int): The width of the plot in pixels
+        method (str): 'minmax' for the lowest and highest point per pixel,
+                      or 'lttb' for Largest-Triangle-Three-Buckets
+        start (double): The first x value to keep, or None for all
+        end (double): The last x value to keep, or None for all
+
+    Returns:
+        tuple: (x, y), the points kept. One point on either side of the
+               window is kept too so the line reaches its edges.
+    """
+
+    lo = 0 if start is None else max(int(np.searchsorted(x, start, side='left')) - 1, 0)
+    hi = len(x) if end is None else min(int(np.searchsorted(x, end, side='right')) + 1, len(x))
+    x = x[lo:hi]
+    y = y[lo:hi]
+    if method == 'lttb':
+        return lttb(x, y, 2 * width)
+    return minMax(x, y, width)
+
+
+def density(x, y, weights, xRange, yRange, bins):
+    """
+    A function to add up points on a square grid of pixels.
+
+    With one bin per pixel or two, millions of points become an image the
+    size of the plot, which shows where they crowd together far better than
+    drawing every point on top of the others.
+
+    Parameters:
+        x (ndarray): The (N,) x values
+        y (ndarray): The (N,) y values
+        weights (ndarray): The (N,) weight of every point, or None to count
+                           them
+        xRange (tuple): The (start, end) of the grid along x
+        yRange (tuple): The (start, end) of the grid along y
+        bins (int): The number of bins along each axis
+
+    Returns:
+        ndarray: A (bins, bins) array of the total weight in every bin,
+                 indexed [y, x] as images are, NaN where there is nothing.
+                 Points outside the grid are left out.
+    """
+
+    ix = np.floor((x - xRange[0]) * (bins / (xRange[1] - xRange[0]))).astype(np.int64)
+    iy = np.floor((y - yRange[0]) * (bins / (yRange[1] - yRange[0]))).astype(np.int64)
+    inside = (ix >= 0) & (ix < bins) & (iy >= 0) & (iy < bins)
+    grid = np.bincount(iy[inside] * bins + ix[inside],
+                       weights=None if weights is None else weights[inside],
+                       minlength=bins * bins).astype(np.float64).reshape(bins, bins)
+    grid[grid == 0] = np.nan
+    return grid
@@ -0,0 +1,297 @@
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .simulator import Simulator
+from .checkpoint import writeCheckpoint, readCheckpoint
+
+# The attributes of a mass that can be set with a 'name.attribute' parameter
+MASS_ATTRIBUTES = ('mass', 'radius', 'x', 'y', 'z', 'xVel', 'yVel', 'zVel')
+
+# Parameters that do not name a mass
+MEMBER_PARAMETERS = ('G', 'dt', 'integrator', 'solver', 'positionNoise', 'velocityNoise', 'seed')
+
+
+def grid(**values):
+    """
+    A function to build the members of an ensemble from every combination
+    of a set of parameter values.
+
+    For example grid(G=[1, 2], dt=[0.1, 0.01]) gives four members.
+
+    Parameters:
+        values: A list of values for every parameter
+
+    Returns:
+        list: A dictionary of parameters for every member
+    """
+
+    keys = list(values)
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values.values())]
+
+
+def sample(numMembers, sampler, seed=0):
+    """
+    A function to build the members of an ensemble by random sampling.
+
+    Parameters:
+        numMembers (int): The number of members
+        sampler (function): A function that takes a NumPy random Generator
+                            and returns a dictionary of parameters
+        seed (int): The seed of the random numbers
+
+    Returns:
+        list: A dictionary of parameters for every member
+    """
+
+    rng = np.random.default_rng(seed)
+    return [sampler(rng) for i in range(numMembers)]
+
+
+def _checkParameters(members, names):
+    """
+    A function used to check that every parameter of every member is known.
+
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        members (list): The dictionaries of parameters
+        names (list): The names of the masses of the base system
+
+    Returns:
+        bool: Whether every parameter is known
+    """
+
+    for params in members:
+        for key in params:
+            if key in MEMBER_PARAMETERS:
+                continue
+            name, _, attribute = key.rpartition('.')
+            if name not in names or attribute not in MASS_ATTRIBUTES:
+                print('Parameter "{}" not recognized.'.format(key))
+                return False
+    return True
+
+
+def _runMember(info, arrays, params, index, duration, dt, numRecords):
+    """
+    A function run by the workers to simulate one member of an ensemble.
+
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        info (dict), arrays (dict): The state of the base system
+        params (dict): The parameters of the member
+        index (int): The number of the member, the default random seed
+        duration (double): The simulation time to cover
+        dt (double): The timestep, unless the member has its own
+        numRecords (int): The number of snapshots to record
+
+    Returns:
+        dict: The recorded snapshots and the summary of the member
+    """
+
+    start = time.time()
+    sim = Simulator(notebook=False)
+    sim._setState(info, arrays)
+    names = list(info['names'])
+
+    dt = params.get('dt', dt)
+    if 'G' in params:
+        sim.G = params['G']
+    if 'integrator' in params:
+        sim.setIntegrator(params['integrator'])
+    if 'solver' in params:
+        sim.setSolver(params['solver'])
+    for key, value in params.items():
+        if key not in MEMBER_PARAMETERS:
+            name, _, attribute = key.rpartition('.')
+            setattr(sim.getMass(name), attribute, value)
+    rng = np.random.default_rng(params.get('seed', index))
+    if 'positionNoise' in params:
+        sim.positions[:] += rng.normal(scale=params['positionNoise'], size=sim.positions.shape)
+    if 'velocityNoise' in params:
+        sim.velocities[:] += rng.normal(scale=params['velocityNoise'], size=sim.velocities.shape)
+
+    numSteps = max(int(round(duration / dt)), 1)
+    recordSteps = np.round(np.linspace(0, numSteps, numRecords)).astype(np.int64)
+    times = np.zeros(numRecords)
+    positions = np.full((numRecords, len(names), 3), np.nan)
+    velocities = np.full((numRecords, len(names), 3), np.nan)
+    energies = np.zeros(numRecords)
+    momenta = np.zeros((numRecords, 3))
+
+    done = 0
+    for k, target in enumerate(recordSteps):
+        sim.step(dt, int(target - done))
+        done = target
+        rows = [names.index(o1.name) for o1 in sim.massList]
+        times[k] = sim.time
+        positions[k, rows] = sim.positions
+        velocities[k, rows] = sim.velocities
+        energies[k] = sim.getEnergy()
+        momenta[k] = np.sum(sim.masses[:, np.newaxis] * sim.velocities, axis=0)
+
+    energyError = np.abs((energies - energies[0]) / energies[0]) if energies[0] != 0 else np.zeros(numRecords)
+    return {'times': times, 'positions': positions, 'velocities': velocities,
+            'summary': {'energyError': float(energyError[-1]),
+                        'maxEnergyError': float(np.max(energyError)),
+                        'momentumDrift': float(np.linalg.norm(momenta[-1] - momenta[0])),
+                        'merges': len(sim.mergeHistory) - len(info['mergeHistory']),
+                        'finalMasses': len(sim.massList),
+                        'wallTime': time.time() - start}}
+
+
+class EnsembleResult:
+    """
+    The results of every member of an ensemble, labeled by member and mass.
+
+    Attributes:
+        params (list): The dictionary of parameters of every member
+        names (list): The names of the masses of the base system
+        times (ndarray): An (M,T) array of the times of the snapshots of
+                         every member
+        positions (ndarray): An (M,T,N,3) array of positions, NaN once a
+                             mass has merged away
+        velocities (ndarray): An (M,T,N,3) array of velocities
+        summary (dict): An (M,) array for every summary statistic:
+                        'energyError' (relative, at the end), 'maxEnergyError',
+                        'momentumDrift', 'merges', 'finalMasses' and 'wallTime'
+    """
+
+    def __init__(self, params, names, times, positions, velocities, summary):
+        """
+        A constructor for an EnsembleResult
+
+        Parameters:
+            params (list), names (list), times (ndarray), positions (ndarray),
+            velocities (ndarray), summary (dict): See the attributes
+        """
+
+        self.params = params
+        self.names = names
+        self.times = times
+        self.positions = positions
+        self.velocities = velocities
+        self.summary = summary
+
+
+    def member(self, index):
+        """
+        A function that returns the parameters and summary of one member.
+
+        Parameters:
+            index (int): The number of the member
+
+        Returns:
+            dict: The parameters and summary statistics together
+        """
+
+        row = dict(self.params[index])
+        row.update({key: value[index].item() for key, value in self.summary.items()})
+        return row
+
+
+    def save(self, path):
+        """
+        A function to save the results to a single file.
+
+        Parameters:
+            path (str): The file
+        """
+
+        arrays = {'times': self.times, 'positions': self.positions,
+                  'velocities': self.velocities}
+        arrays.update({'summary_' + key: value for key, value in self.summary.items()})
+        params = [{key: value.item() if isinstance(value, np.generic) else value
+                   for key, value in p.items()} for p in self.params]
+        writeCheckpoint(path, {'params': params, 'names': self.names}, arrays)
+
+
+    @staticmethod
+    def load(path):
+        """
+        A function to read results saved with save().
+
+        Parameters:
+            path (str): The file
+
+        Returns:
+            EnsembleResult: The results
+        """
+
+        info, arrays = readCheckpoint(path)
+        summary = {key[len('summary_'):]: value for key, value in arrays.items()
+                   if key.startswith('summary_')}
+        return EnsembleResult(info['params'], info['names'], arrays['times'],
+                              arrays['positions'], arrays['velocities'], summary)
+
+
+def runEnsemble(simulator, members, duration, dt=1, numRecords=11, workers=None):
+    """
+    A function to run many variants of a system at once.
+
+    Every member starts from the current state of simulator (which is not
+    changed) with its own parameters applied, and runs for the same
+    simulation time, recording numRecords evenly spaced snapshots. Members
+    run in parallel on a pool of worker processes. The parameters a member
+    can set are:
+        'G': Newton's gravitational constant
+        'dt': The timestep
+        'integrator', 'solver': As for setIntegrator() and setSolver()
+        'name.attribute': An attribute of a mass, for example 'earth.xVel';
+                          one of mass, radius, x, y, z, xVel, yVel or zVel
+        'positionNoise', 'velocityNoise': The standard deviation of Gaussian
+                                          noise added to every position or
+                                          velocity component
+        'seed': The seed of the noise, by default the number of the member
+    Build the list of members with grid() or sample(), or by hand.
+
+    Parameters:
+        simulator (Simulator): The base system
+        members (list): A dictionary of parameters for every member
+        duration (double): The simulation time every member runs for
+        dt (double): The timestep of members that do not set their own
+        numRecords (int): The number of snapshots recorded per member,
+                          including the first and the last
+        workers (int): The number of worker processes, None for every core,
+                       or 1 to run in this process. The workers import the
+                       calling script, so scripts need the usual
+                       if __name__ == '__main__': guard
+
+    Returns:
+        EnsembleResult: The results of every member, or None if a
+                        parameter is not recognized
+    """
+
+    info, arrays = simulator._getState()
+    arrays = {key: np.array(value) for key, value in arrays.items()}
+    names = list(info['names'])
+    if not _checkParameters(members, names):
+        return None
+
+    jobs = [(info, arrays, dict(params), index, duration, dt, numRecords)
+            for index, params in enumerate(members)]
+    if workers == 1:
+        results = [_runMember(*job) for job in jobs]
+    else:
+        if workers == None:
+            workers = os.cpu_count()
+        workers = max(1, min(workers, len(jobs)))
+        # Workers are started fresh rather than forked, as forking a process
+        # whose compiled kernels have started threads can leave them hung
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_runMember, *zip(*jobs)))
+
+    summary = {key: np.array([r['summary'][key] for r in results])
+               for key in results[0]['summary']} if results else {}
+    return EnsembleResult([dict(params) for params in members], names,
+                          np.array([r['times'] for r in results]),
+                          np.array([r['positions'] for r in results]),
+                          np.array([r['velocities'] for r in results]),
+                          summary)
@@ -0,0 +1,150 @@
+import numpy as np
+
+from .kernels import haveNumba, jitAccelerations
+
+# Default amount of memory (in bytes) a single block of pair differences may use
+CHUNK_MEMORY = 32 * 2**20
+
+
+def _chunkRows(numRows, numCols, chunkMemory):
+    """
+    A function used to decide how many rows of pairs to evaluate at once.
+
+    Every row of a block holds numCols 3-vectors of float64, so the number of
+    rows is chosen to keep the block below chunkMemory bytes.
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        numRows (int): The number of rows that need evaluating
+        numCols (int): The number of columns in every row
+        chunkMemory (int): The maximum size of a block in bytes
+
+    Returns:
+        int: The number of rows to evaluate per block
+    """
+
+    rows = chunkMemory // max(1, numCols * 3 * 8)
+    return int(min(max(rows, 1), max(numRows, 1)))
+
+
+def directAccelerations(positions, masses, G, chunkMemory=CHUNK_MEMORY, targets=None, jit=None):
+    """
+    A function to calculate gravitational accelerations by direct summation.
+
+    This function computes the acceleration of every mass due to every other
+    mass exactly, which is O(N^2). The pairs are evaluated in vectorized
+    blocks of rows so the temporary arrays never grow above chunkMemory bytes.
+    When Numba is installed a compiled loop that needs no temporary arrays is
+    used instead (see kernels.jitAccelerations()).
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        masses (ndarray): An (N,) array of masses
+        G (double): Newton's gravitational constant
+        chunkMemory (int): The maximum size in bytes of a block of pairs
+        targets (ndarray): Indices of the masses to calculate, or None for all
+        jit (bool): Whether to use the compiled loop, or None to use it
+                    whenever Numba can be used
+
+    Returns:
+        ndarray: An (N,3) array of accelerations, or (len(targets),3)
+    """
+
+    if jit is None:
+        jit = haveNumba()
+    if jit:
+        return jitAccelerations(positions, masses, G, targets)
+
+    N = len(masses)
+    if targets is None:
+        targets = np.arange(N)
+    acc = np.zeros((len(targets), 3))
+    if N < 2:
+        return acc
+
+    rows = _chunkRows(len(targets), N, chunkMemory)
+    for start in range(0, len(targets), rows):
+        block = targets[start:start + rows]
+        # Separation vectors pointing from each mass in the block to every mass
+        d = positions[np.newaxis, :, :] - positions[block, np.newaxis, :]
+        r2 = np.einsum('ijk,ijk->ij', d, d)
+        # A mass does not pull on itself
+        r2[np.arange(len(block)), block] = np.inf
+        weight = masses[np.newaxis, :] / (r2 * np.sqrt(r2))
+        acc[start:start + rows] = G * np.einsum('ij,ijk->ik', weight, d)
+
+    return acc
+
+
+def directJerk(positions, velocities, masses, G, chunkMemory=CHUNK_MEMORY, targets=None):
+    """
+    A function to calculate the time derivative of the accelerations.
+
+    The jerk of every mass is summed directly over every other mass, in the
+    same vectorized blocks as directAccelerations(). It is used to pick
+    timesteps, so it is only needed occasionally.
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        velocities (ndarray): An (N,3) array of velocities
+        masses (ndarray): An (N,) array of masses
+        G (double): Newton's gravitational constant
+        chunkMemory (int): The maximum size in bytes of a block of pairs
+        targets (ndarray): Indices of the masses to calculate, or None for all
+
+    Returns:
+        ndarray: An (N,3) array of jerks, or (len(targets),3)
+    """
+
+    N = len(masses)
+    if targets is None:
+        targets = np.arange(N)
+    jerk = np.zeros((len(targets), 3))
+    if N < 2:
+        return jerk
+
+    rows = _chunkRows(len(targets), 2 * N, chunkMemory)
+    for start in range(0, len(targets), rows):
+        block = targets[start:start + rows]
+        d = positions[np.newaxis, :, :] - positions[block, np.newaxis, :]
+        dv = velocities[np.newaxis, :, :] - velocities[block, np.newaxis, :]
+        r2 = np.einsum('ijk,ijk->ij', d, d)
+        r2[np.arange(len(block)), block] = np.inf
+        weight = masses[np.newaxis, :] / (r2 * np.sqrt(r2))
+        rv = 3 * np.einsum('ijk,ijk->ij', d, dv) / r2
+        jerk[start:start + rows] = G * (np.einsum('ij,ijk->ik', weight, dv)
+                                        - np.einsum('ij,ijk->ik', weight * rv, d))
+
+    return jerk
+
+
+def potentialEnergy(positions, masses, G, chunkMemory=CHUNK_MEMORY):
+    """
+    A function to calculate the total gravitational potential energy.
+
+    Every pair is counted once, and the pairs are evaluated in vectorized
+    blocks of rows in the same way as directAccelerations().
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        masses (ndarray): An (N,) array of masses
+        G (double): Newton's gravitational constant
+        chunkMemory (int): The maximum size in bytes of a block of pairs
+
+    Returns:
+        double: The potential energy of the system
+    """
+
+    N = len(masses)
+    energy = 0.0
+    rows = _chunkRows(N, N, chunkMemory)
+    for start in range(0, N, rows):
+        stop = min(start + rows, N)
+        d = positions[np.newaxis, :, :] - positions[start:stop, np.newaxis, :]
+        r = np.sqrt(np.einsum('ijk,ijk->ij', d, d))
+        # Only pairs with j < i are counted
+        lower = np.arange(N)[np.newaxis, :] < np.arange(start, stop)[:, np.newaxis]
+        r = np.where(lower, r, np.inf)
+        energy -= G * np.sum(masses[start:stop, np.newaxis] * masses[np.newaxis, :] / r)
+
+    return float(energy)
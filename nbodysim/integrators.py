@@ -0,0 +1,311 @@
+import numpy as np
+
+from .forces import directJerk
+
+
+class Euler:
+    """
+    The explicit Euler integrator.
+
+    Positions are moved with the velocities from the start of the step, and
+    velocities with the accelerations from the start of the step. It is first
+    order and not symplectic, so it needs very small steps to stay accurate.
+    """
+
+    def integrate(self, sim, dt):
+        """
+        A function to move the simulator's masses forward by dt.
+
+        Parameters:
+            sim (Simulator): The simulator to move
+            dt (double): The timestep to move it forward
+        """
+
+        sim._calcForces()
+        sim.positions[:] += sim.velocities * dt
+        sim.velocities[:] += sim.accelerations * dt
+
+
+class Leapfrog:
+    """
+    The kick-drift-kick leapfrog (velocity Verlet) integrator.
+
+    Each step is a half kick of the velocities, a full drift of the positions
+    and another half kick. It is second order and symplectic, so the energy
+    error stays bounded instead of drifting. The accelerations at the end of a
+    step are reused at the start of the next, so it needs one force
+    calculation per step.
+    """
+
+    def integrate(self, sim, dt):
+        """
+        A function to move the simulator's masses forward by dt.
+
+        Parameters:
+            sim (Simulator): The simulator to move
+            dt (double): The timestep to move it forward
+        """
+
+        if not sim._forcesCurrent():
+            sim._calcForces()
+        sim.velocities[:] += sim.accelerations * (dt / 2)
+        sim.positions[:] += sim.velocities * dt
+        sim._calcForces()
+        sim.velocities[:] += sim.accelerations * (dt / 2)
+
+
+class Yoshida4:
+    """
+    Yoshida's fourth order symplectic integrator.
+
+    Each step is three leapfrog steps of lengths w1*dt, w0*dt and w1*dt (the
+    middle one going backwards in time), which cancels the third order error
+    of leapfrog. It needs three force calculations per step.
+    """
+
+    W1 = 1 / (2 - 2 ** (1 / 3))
+    W0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+
+    def __init__(self):
+        """
+        A constructor for a Yoshida4 integrator
+        """
+        self._leapfrog = Leapfrog()
+
+    def integrate(self, sim, dt):
+        """
+        A function to move the simulator's masses forward by dt.
+
+        Parameters:
+            sim (Simulator): The simulator to move
+            dt (double): The timestep to move it forward
+        """
+
+        for w in (self.W1, self.W0, self.W1):
+            self._leapfrog.integrate(sim, w * dt)
+
+
+class RK45:
+    """
+    The adaptive Dormand-Prince Runge-Kutta 5(4) integrator.
+
+    Each call covers dt with as many substeps as the error estimate asks for.
+    A substep is accepted when the difference between the fifth and fourth
+    order solutions is below atol + rtol times the size of the positions (or
+    velocities), and the substep length carries over between calls.
+
+    Parameters:
+        rtol (double): The relative error allowed per substep
+        atol (double): The absolute error allowed per substep
+    """
+
+    A = [[],
+         [1 / 5],
+         [3 / 40, 9 / 40],
+         [44 / 45, -56 / 15, 32 / 9],
+         [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+         [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+         [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]]
+    # Fifth order weights are the last row of A, these are the differences to
+    # the embedded fourth order weights
+    E = [71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40]
+
+    def __init__(self, rtol=1e-9, atol=0.0):
+        """
+        A constructor for an RK45 integrator
+
+        Parameters:
+            rtol (double): The relative error allowed per substep
+            atol (double): The absolute error allowed per substep
+        """
+        self.rtol = rtol
+        self.atol = atol
+        self.h = None
+
+    def integrate(self, sim, dt):
+        """
+        A function to move the simulator's masses forward by dt.
+
+        Parameters:
+            sim (Simulator): The simulator to move
+            dt (double): The timestep to move it forward
+        """
+
+        if len(sim.massList) == 0:
+            return
+
+        x = sim.positions.copy()
+        v = sim.velocities.copy()
+        a = sim._accelerationsAt(x)
+        h = dt if self.h is None else min(self.h, dt)
+        t = 0.0
+
+        while dt - t > 1e-12 * dt:
+            h = min(h, dt - t)
+            kx = [v]
+            kv = [a]
+            for stage in range(1, 7):
+                xs = x + h * sum(c * k for c, k in zip(self.A[stage], kx))
+                vs = v + h * sum(c * k for c, k in zip(self.A[stage], kv))
+                kx.append(vs)
+                kv.append(sim._accelerationsAt(xs))
+
+            errX = h * sum(e * k for e, k in zip(self.E, kx))
+            errV = h * sum(e * k for e, k in zip(self.E, kv))
+            scaleX = self.atol + self.rtol * max(np.max(np.abs(x)), np.max(np.abs(xs)))
+            scaleV = self.atol + self.rtol * max(np.max(np.abs(v)), np.max(np.abs(vs)))
+            err = max(np.max(np.abs(errX)) / max(scaleX, 1e-300),
+                      np.max(np.abs(errV)) / max(scaleV, 1e-300))
+
+            if err <= 1:
+                # The last stage is the solution, so its accelerations are reused
+                t += h
+                x = xs
+                v = vs
+                a = kv[6]
+            h *= min(5.0, max(0.2, 0.9 * (max(err, 1e-10)) ** -0.2))
+
+        self.h = h
+        sim.positions[:] = x
+        sim.velocities[:] = v
+        sim.accelerations[:] = a
+        sim._calcAcceleration()
+
+
+class BlockLeapfrog:
+    """
+    A kick-drift-kick leapfrog integrator with hierarchical block timesteps.
+
+    Every mass gets its own timestep dt/2^level, with level between 0 and
+    maxLevel, chosen from Aarseth's criterion eta*sqrt(|a|/|jerk|). Masses
+    only get their forces calculated and their velocities kicked at the end
+    of their own timesteps, while every position drifts, so a tight binary
+    does not force small steps on the rest of the system. A mass may move to
+    a smaller timestep at the end of any of its steps, and to a larger one
+    when the larger step lines up with the current time. All masses are
+    synchronized again at the end of every call.
+
+    The first jerks are estimated from the change in acceleration when the
+    masses drift for the smallest allowed step, which costs one more force
+    calculation with the chosen solver (with the direct solver they are
+    summed exactly instead, at about the same cost). After that they are
+    estimated from the change in acceleration over each mass's last step.
+
+    Parameters:
+        eta (double): The accuracy parameter of the timestep criterion
+        maxLevel (int): The number of times dt may be halved
+    """
+
+    def __init__(self, eta=0.02, maxLevel=10):
+        """
+        A constructor for a BlockLeapfrog integrator
+
+        Parameters:
+            eta (double): The accuracy parameter of the timestep criterion
+            maxLevel (int): The number of times dt may be halved
+        """
+        self.eta = eta
+        self.maxLevel = maxLevel
+        self.levels = None
+        self._jerk = None
+
+    def _chooseLevels(self, acc, jerk, dt):
+        """
+        A function used to turn the timestep criterion into block levels.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            acc (ndarray): A (k,3) array of accelerations
+            jerk (ndarray): A (k,3) array of jerks
+            dt (double): The timestep of level 0
+
+        Returns:
+            ndarray: The (k,) levels the criterion asks for
+        """
+
+        a = np.sqrt(np.einsum('ij,ij->i', acc, acc))
+        j = np.sqrt(np.einsum('ij,ij->i', jerk, jerk))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ideal = self.eta * np.sqrt(a / j)
+            level = np.ceil(np.log2(dt / ideal))
+        level = np.nan_to_num(level, nan=0, posinf=self.maxLevel, neginf=0)
+        return np.clip(level, 0, self.maxLevel).astype(np.int64)
+
+    def _firstJerk(self, sim, dt):
+        """
+        A function used to find the jerks before any step has been taken.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            sim (Simulator): The simulator, with its forces calculated
+            dt (double): The timestep of level 0
+
+        Returns:
+            ndarray: An (N,3) array of jerks
+        """
+
+        if sim.solver == 'direct':
+            return directJerk(sim.positions, sim.velocities, sim.masses, sim.G)
+
+        h = dt / 2 ** self.maxLevel
+        drifted = sim._accelerationsAt(sim.positions + sim.velocities * h)
+        return (drifted - sim.accelerations) / h
+
+    def integrate(self, sim, dt):
+        """
+        A function to move the simulator's masses forward by dt.
+
+        Parameters:
+            sim (Simulator): The simulator to move
+            dt (double): The timestep to move it forward
+        """
+
+        N = len(sim.massList)
+        if N == 0:
+            return
+
+        if not sim._forcesCurrent() or self._jerk is None or len(self._jerk) != N:
+            sim._calcForces()
+            self._jerk = self._firstJerk(sim, dt)
+        acc = sim.accelerations.copy()
+        levels = self._chooseLevels(acc, self._jerk, dt)
+
+        # Time is counted in ticks of the smallest allowed step
+        totalTicks = 2 ** self.maxLevel
+        tick = dt / totalTicks
+        stepTicks = 2 ** (self.maxLevel - levels)
+
+        sim.velocities[:] += acc * (stepTicks * tick / 2)[:, np.newaxis]
+        ends = stepTicks.copy()
+        t = 0
+        while t < totalTicks:
+            nextT = int(ends.min())
+            sim.positions[:] += sim.velocities * ((nextT - t) * tick)
+            t = nextT
+
+            active = np.flatnonzero(ends == t)
+            newAcc = sim._accelerationsAt(sim.positions, targets=active)
+            stepTime = stepTicks[active] * tick
+            sim.velocities[active] += newAcc * (stepTime / 2)[:, np.newaxis]
+            self._jerk[active] = (newAcc - acc[active]) / stepTime[:, np.newaxis]
+            acc[active] = newAcc
+            if t == totalTicks:
+                break
+
+            # Larger steps are only allowed one level at a time, and only
+            # when they line up with the current time
+            wanted = self._chooseLevels(newAcc, self._jerk[active], dt)
+            coarser = np.maximum(levels[active] - 1, 0)
+            aligned = (t % (2 ** (self.maxLevel - coarser))) == 0
+            newLevels = np.where(wanted >= levels[active], wanted,
+                                 np.where(aligned, coarser, levels[active]))
+            levels[active] = newLevels
+            stepTicks[active] = 2 ** (self.maxLevel - newLevels)
+            sim.velocities[active] += newAcc * (stepTicks[active] * tick / 2)[:, np.newaxis]
+            ends[active] = t + stepTicks[active]
+
+        self.levels = levels
+        sim.accelerations[:] = acc
+        sim._calcAcceleration()
@@ -0,0 +1,143 @@
+import importlib.util
+import sys
+
+import numpy as np
+
+# Whether Numba is installed. Numba itself is only imported the first time
+# haveNumba() is called, and this is set to False if that fails
+HAVE_NUMBA = importlib.util.find_spec('numba') is not None
+
+# The number of threads chosen with setThreads(), or None for every core
+_numThreads = None
+
+
+def _compiled():
+    """
+    A function used to load the compiled loops, importing Numba.
+
+    (Note: it is not recommended that you use this function directly.)
+
+    Returns:
+        module: nbodysim.compiled
+    """
+
+    from . import compiled
+    if _numThreads is not None:
+        compiled.numba.set_num_threads(_numThreads)
+    return compiled
+
+
+def haveNumba():
+    """
+    A function that returns whether the compiled kernels can be used.
+
+    Numba is imported the first time this is called. If it is installed but
+    cannot be imported (for example because it does not support the
+    installed NumPy), a note is printed once and the NumPy code is used from
+    then on.
+
+    Returns:
+        bool: Whether the compiled kernels can be used
+    """
+
+    global HAVE_NUMBA
+    if HAVE_NUMBA and 'nbodysim.compiled' not in sys.modules:
+        try:
+            _compiled()
+        except ImportError as error:
+            print("Numba could not be imported ({}), so NumPy is used instead.".format(error))
+            HAVE_NUMBA = False
+    return HAVE_NUMBA
+
+
+def setThreads(numThreads):
+    """
+    A function to choose how many threads the compiled loops of this thread
+    spread across.
+
+    Parameters:
+        numThreads (int): The number of threads, at most the number of cores
+    """
+
+    global _numThreads
+    _numThreads = numThreads
+    if HAVE_NUMBA and 'nbodysim.compiled' in sys.modules:
+        _compiled()
+
+
+def startThreads():
+    """
+    A function to start the threads of the compiled loops from the calling
+    thread.
+
+    Numba's TBB threading layer hangs when Python exits if its threads were
+    first started from a thread other than the main one, so code that runs
+    the loops on a background thread calls this first.
+    """
+
+    if haveNumba():
+        jitAccelerations(np.array([[0.0, 0, 0], [1, 0, 0]]), np.ones(2), 1.0)
+
+
+def jitAccelerations(positions, masses, G, targets=None):
+    """
+    A function to calculate direct-sum accelerations with a compiled loop.
+
+    This gives the same accelerations as forces.directAccelerations() (to
+    rounding), but the pairs are summed in a fused loop compiled with Numba,
+    spread across threads, so no temporary arrays of pairs are needed at all.
+    It can only be used when Numba is installed.
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        masses (ndarray): An (N,) array of masses
+        G (double): Newton's gravitational constant
+        targets (ndarray): Indices of the masses to calculate, or None for all
+
+    Returns:
+        ndarray: An (N,3) array of accelerations, or (len(targets),3)
+    """
+
+    N = len(masses)
+    if targets is None:
+        targets = np.arange(N)
+    out = np.zeros((len(targets), 3))
+    if N < 2 or len(targets) == 0:
+        return out
+    _compiled().accelerationKernel(np.ascontiguousarray(positions, dtype=np.float64),
+                        np.ascontiguousarray(masses, dtype=np.float64), float(G),
+                        np.ascontiguousarray(targets, dtype=np.int64), out)
+    return out
+
+
+def jitOverlappingPairs(positions, reach, lo, hi):
+    """
+    A function to run the sweep-and-prune of neighbors.overlappingPairs() compiled.
+
+    The sweep walks the spheres in order of the lower edges lo of their
+    extents along the sweep axis and stops as soon as a later sphere starts
+    after the current one ends, checking every candidate exactly on the way,
+    so no arrays of candidate pairs are built. It can only be used when Numba
+    is installed.
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        reach (ndarray): An (N,) array of radii
+        lo (ndarray): The (N,) lower edges of the extents along the sweep axis
+        hi (ndarray): The (N,) upper edges of the extents along the sweep axis
+
+    Returns:
+        tuple: Two integer arrays (i, j) with i > j for every overlapping pair,
+               in no particular order
+    """
+
+    positions = np.ascontiguousarray(positions, dtype=np.float64)
+    reach = np.ascontiguousarray(reach, dtype=np.float64)
+    order = np.argsort(lo, kind='stable')
+    empty = np.zeros(0, dtype=np.int64)
+    kernels = _compiled()
+    count = kernels.overlapKernel(positions, reach, order, lo, hi, False, empty, empty)
+    outI = np.zeros(count, dtype=np.int64)
+    outJ = np.zeros(count, dtype=np.int64)
+    kernels.overlapKernel(positions, reach, order, lo, hi, True, outI, outJ)
+    return outI, outJ
@@ -0,0 +1,118 @@
+import numpy as np
+
+from .kernels import haveNumba, jitOverlappingPairs
+
+# The largest number of candidate pairs generated at once
+MAX_CANDIDATES = 2**22
+
+
+def overlappingPairs(positions, reach, jit=None):
+    """
+    A function to find every pair of spheres that touch or overlap.
+
+    Every mass i is treated as a sphere of radius reach[i], and the pairs with
+    a distance no larger than reach[i]+reach[j] are returned. This uses a
+    sweep-and-prune over the axis with the largest spread: the spheres are
+    sorted by the lower edge of their extent along that axis, and only pairs
+    whose extents overlap along it are checked exactly, in blocks of at most
+    MAX_CANDIDATES pairs. When Numba is installed the sweep runs as a compiled
+    loop instead, which needs no arrays of candidate pairs.
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        reach (ndarray): An (N,) array of radii, or a single radius for all
+        jit (bool): Whether to use the compiled sweep, or None to use it
+                    whenever Numba can be used
+
+    Returns:
+        tuple: Two integer arrays (i, j) with i > j for every overlapping pair,
+               sorted by i and then j
+    """
+
+    N = len(positions)
+    reach = np.broadcast_to(np.asarray(reach, dtype=float), (N,))
+    if N < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    axis = int(np.argmax(np.ptp(positions, axis=0)))
+    # The extents are widened by a couple of ulps so rounding can never
+    # prune a pair that the exact check would accept
+    lo = np.nextafter(np.nextafter(positions[:, axis] - reach, -np.inf), -np.inf)
+    hi = np.nextafter(np.nextafter(positions[:, axis] + reach, np.inf), np.inf)
+
+    if jit is None:
+        jit = haveNumba()
+    if jit:
+        i, j = jitOverlappingPairs(positions, reach, lo, hi)
+        sort = np.lexsort((j, i))
+        return i[sort], j[sort]
+
+    order = np.argsort(lo, kind='stable')
+    loSorted = lo[order]
+
+    # Every sorted sphere k is checked against the later spheres starting
+    # before it ends
+    counts = np.searchsorted(loSorted, hi[order], side='right') - np.arange(1, N + 1)
+    counts = np.maximum(counts, 0)
+    ends = np.cumsum(counts)
+
+    pairsI = []
+    pairsJ = []
+    k0 = 0
+    while k0 < N:
+        done = ends[k0 - 1] if k0 > 0 else 0
+        k1 = max(int(np.searchsorted(ends, done + MAX_CANDIDATES, side='right')), k0 + 1)
+        k1 = min(k1, N)
+        c = counts[k0:k1]
+        first = np.repeat(np.arange(k0, k1), c)
+        offset = np.arange(len(first)) - np.repeat(np.cumsum(c) - c, c)
+        a = order[first]
+        b = order[first + 1 + offset]
+
+        d = positions[a] - positions[b]
+        hit = np.sqrt(np.einsum('ij,ij->i', d, d)) <= reach[a] + reach[b]
+        pairsI.append(np.maximum(a[hit], b[hit]))
+        pairsJ.append(np.minimum(a[hit], b[hit]))
+        k0 = k1
+
+    i = np.concatenate(pairsI)
+    j = np.concatenate(pairsJ)
+    sort = np.lexsort((j, i))
+    return i[sort], j[sort]
+
+
+def connectedGroups(numNodes, i, j):
+    """
+    A function to group nodes joined by pairs into connected components.
+
+    This is a vectorized union-find: every pair hooks the root of its larger
+    label onto the smaller one, and pointer jumping compresses the paths,
+    until no pair joins two different roots. Chains of pairs of any length end
+    up in the same group regardless of the order the pairs are listed in.
+
+    Parameters:
+        numNodes (int): The number of nodes
+        i (ndarray): The first node of every pair
+        j (ndarray): The second node of every pair
+
+    Returns:
+        ndarray: A (numNodes,) array giving every node the smallest index in
+                 its group
+    """
+
+    parent = np.arange(numNodes)
+    while True:
+        ri = parent[i]
+        rj = parent[j]
+        joined = ri != rj
+        if not np.any(joined):
+            return parent
+        lo = np.minimum(ri[joined], rj[joined])
+        hi = np.maximum(ri[joined], rj[joined])
+        np.minimum.at(parent, hi, lo)
+        # Pointer jumping until every node points at its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
@@ -0,0 +1,242 @@
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .forces import directAccelerations, CHUNK_MEMORY, _chunkRows
+from .kernels import setThreads, haveNumba
+
+# Shared memory blocks a worker process has already attached to, by name
+_attached = {}
+
+
+def _attach(name):
+    """
+    A function used by the workers to open a shared memory block once.
+
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        name (str): The name of the shared memory block
+
+    Returns:
+        SharedMemory: The attached block
+    """
+
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _initWorker():
+    """
+    A function run once by every worker as it starts.
+
+    The workers already use one core each, so the compiled loop is kept to a
+    single thread in every worker rather than each spreading across all of
+    the cores.
+    (Note: it is not recommended that you use this function directly.)
+    """
+
+    setThreads(1)
+
+
+def _forceTile(names, N, G, chunkMemory, targets, jit):
+    """
+    A function run by the workers to calculate one tile of accelerations.
+
+    The positions and masses are read from, and the accelerations written to,
+    the shared memory blocks of a ForcePool.
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        names (tuple): The names of the positions, masses and output blocks
+        N (int): The number of masses
+        G (double): Newton's gravitational constant
+        chunkMemory (int): The maximum size in bytes of a block of pairs
+        targets (ndarray): The indices of the masses in this tile
+        jit (bool): Whether to use the compiled loop, or None to use it
+                    whenever Numba can be used
+    """
+
+    posName, massName, accName = names
+    positions = np.ndarray((N, 3), buffer=_attach(posName).buf)
+    masses = np.ndarray((N,), buffer=_attach(massName).buf)
+    out = np.ndarray((N, 3), buffer=_attach(accName).buf)
+    out[targets] = directAccelerations(positions, masses, G, chunkMemory, targets, jit)
+
+
+class ForcePool:
+    """
+    A pool of worker processes that calculate direct-sum gravity together.
+
+    The positions and masses are copied into shared memory once per call and
+    the workers read them from there, each calculating the accelerations of a
+    tile of rows. Tiles are whole multiples of the blocks the serial
+    directAccelerations() uses, so every row is summed in exactly the same
+    order and the result matches the serial path bit for bit, whatever the
+    number of workers.
+
+    Attributes:
+        workers (int): The number of worker processes
+    """
+
+    def __init__(self, workers):
+        """
+        A constructor for a ForcePool
+
+        Parameters:
+            workers (int): The number of worker processes
+        """
+        self.workers = workers
+        # Workers are started fresh rather than forked, as forking a process
+        # whose compiled kernels have started threads can leave them hung
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_initWorker)
+        self._blocks = None
+        self._capacity = 0
+
+
+    def _ensureCapacity(self, N):
+        """
+        A function used to make sure the shared memory can hold N masses.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            N (int): The number of masses
+        """
+
+        if N <= self._capacity:
+            return
+        self._release()
+        capacity = max(N, 2 * self._capacity, 16)
+        self._blocks = (shared_memory.SharedMemory(create=True, size=capacity * 3 * 8),
+                        shared_memory.SharedMemory(create=True, size=capacity * 8),
+                        shared_memory.SharedMemory(create=True, size=capacity * 3 * 8))
+        self._capacity = capacity
+
+
+    def accelerations(self, positions, masses, G, chunkMemory=CHUNK_MEMORY, targets=None,
+                      jit=None):
+        """
+        A function to calculate direct-sum accelerations across the workers.
+
+        Parameters:
+            positions (ndarray): An (N,3) array of positions
+            masses (ndarray): An (N,) array of masses
+            G (double): Newton's gravitational constant
+            chunkMemory (int): The maximum size in bytes of a block of pairs
+            targets (ndarray): Indices of the masses to calculate, or None for all
+            jit (bool): Whether to use the compiled loop, or None to use it
+                        whenever Numba can be used
+
+        Returns:
+            ndarray: An (N,3) array of accelerations, or (len(targets),3)
+        """
+
+        N = len(masses)
+        if targets is None:
+            targets = np.arange(N)
+        if N < 2 or len(targets) == 0:
+            return np.zeros((len(targets), 3))
+
+        self._ensureCapacity(N)
+        posBlock, massBlock, accBlock = self._blocks
+        np.ndarray((N, 3), buffer=posBlock.buf)[:] = positions
+        np.ndarray((N,), buffer=massBlock.buf)[:] = masses
+        out = np.ndarray((N, 3), buffer=accBlock.buf)
+
+        rows = _chunkRows(len(targets), N, chunkMemory)
+        blocksPerTile = -(-len(targets) // (rows * self.workers))
+        tile = rows * blocksPerTile
+        names = (posBlock.name, massBlock.name, accBlock.name)
+        futures = [self._executor.submit(_forceTile, names, N, G, chunkMemory,
+                                         targets[start:start + tile], jit)
+                   for start in range(0, len(targets), tile)]
+        for f in futures:
+            f.result()
+        return out[targets].copy()
+
+
+    def _release(self):
+        """
+        A function used to free the shared memory blocks.
+
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        if self._blocks is not None:
+            for block in self._blocks:
+                block.close()
+                block.unlink()
+        self._blocks = None
+        self._capacity = 0
+
+
+    def close(self):
+        """
+        A function to stop the workers and free the shared memory.
+        """
+
+        self._executor.shutdown()
+        self._release()
+
+
+# One pool per number of workers, shared by every simulator in the process
+_pools = {}
+
+
+def parallelAccelerations(positions, masses, G, workers=None, chunkMemory=CHUNK_MEMORY,
+                          targets=None, jit=None):
+    """
+    A function to calculate direct-sum accelerations on several cores.
+
+    This gives the same result as directAccelerations(), with the rows split
+    into tiles across a pool of worker processes that read the positions and
+    masses from shared memory. The pool is started on the first call and
+    reused afterwards. The workers import the calling script, so scripts
+    need the usual if __name__ == '__main__': guard.
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        masses (ndarray): An (N,) array of masses
+        G (double): Newton's gravitational constant
+        workers (int): The number of worker processes, or None for every core
+        chunkMemory (int): The maximum size in bytes of a block of pairs
+        targets (ndarray): Indices of the masses to calculate, or None for all
+        jit (bool): Whether the workers use the compiled loop, one thread
+                    each, or None to do so whenever Numba can be used
+
+    Returns:
+        ndarray: An (N,3) array of accelerations, or (len(targets),3)
+    """
+
+    if workers is None:
+        workers = os.cpu_count()
+    if jit is None:
+        jit = haveNumba()
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = ForcePool(workers)
+        _pools[workers] = pool
+    return pool.accelerations(positions, masses, G, chunkMemory, targets, jit)
+
+
+@atexit.register
+def _closePools():
+    """
+    A function used to shut every pool down when Python exits.
+
+    (Note: it is not recommended that you use this function directly.)
+    """
+
+    for pool in _pools.values():
+        pool.close()
+    _pools.clear()
@@ -0,0 +1,214 @@
+import numpy as np
+
+from .neighbors import overlappingPairs
+
+# The long/short range split radius, in units of the mesh spacing
+SPLIT_SCALE = 1.25
+
+# Pairs further apart than this many split radii get no short-range correction
+CUTOFF_SCALE = 6.0
+
+
+def _erfc(x):
+    """
+    A function for the complementary error function of an array.
+
+    Uses the Chebyshev fit from Numerical Recipes, with a relative error
+    below 1.2e-7 everywhere, so the mesh does not depend on SciPy.
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        x (ndarray): The values to evaluate, which must be >= 0
+
+    Returns:
+        ndarray: erfc(x)
+    """
+
+    t = 1 / (1 + 0.5 * x)
+    poly = (-1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 +
+            t * (-0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 +
+            t * (-0.82215223 + t * 0.17087277)))))))))
+    return t * np.exp(-x * x + poly)
+
+
+class Mesh:
+    """
+    A cubic mesh covering a set of positions, used by the particle-mesh solver.
+
+    The mesh has gridSize cells along each axis, with the positions kept at
+    least one cell away from the edges so that every cloud-in-cell stencil
+    lies inside it.
+
+    Attributes:
+        gridSize (int): The number of cells along each axis
+        spacing (double): The side length of a cell
+        origin (ndarray): The corner of the mesh
+    """
+
+    def __init__(self, positions, gridSize):
+        """
+        A constructor for a Mesh
+
+        Parameters:
+            positions (ndarray): An (N,3) array of positions to cover
+            gridSize (int): The number of cells along each axis
+        """
+
+        lo = positions.min(axis=0)
+        hi = positions.max(axis=0)
+        extent = float(np.max(hi - lo))
+        self.gridSize = gridSize
+        self.spacing = extent / (gridSize - 3) if extent > 0 else 1.0
+        self.origin = (lo + hi) / 2 - gridSize * self.spacing / 2
+
+
+    def _stencil(self, positions):
+        """
+        A function used to find the cloud-in-cell stencil of every position.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            positions (ndarray): An (N,3) array of positions
+
+        Returns:
+            tuple: (cells, weights), the (N,8) flat cell indices and the (N,8)
+                   weights of the eight cells around every position
+        """
+
+        n = self.gridSize
+        u = (positions - self.origin) / self.spacing - 0.5
+        i0 = np.clip(np.floor(u).astype(np.int64), 0, n - 2)
+        f = u - i0
+
+        cells = []
+        weights = []
+        for corner in range(8):
+            offset = (corner >> np.arange(3)) & 1
+            idx = i0 + offset
+            cells.append((idx[:, 0] * n + idx[:, 1]) * n + idx[:, 2])
+            weights.append(np.prod(np.where(offset == 1, f, 1 - f), axis=1))
+        return np.stack(cells, axis=1), np.stack(weights, axis=1)
+
+
+    def deposit(self, positions, masses):
+        """
+        A function to spread masses onto the mesh with cloud-in-cell weights.
+
+        Parameters:
+            positions (ndarray): An (N,3) array of positions
+            masses (ndarray): An (N,) array of masses
+
+        Returns:
+            ndarray: A (gridSize,gridSize,gridSize) array of the mass in every cell
+        """
+
+        n = self.gridSize
+        cells, weights = self._stencil(positions)
+        grid = np.bincount(cells.ravel(), (weights * masses[:, np.newaxis]).ravel(),
+                           minlength=n ** 3)
+        return grid.reshape(n, n, n)
+
+
+    def interpolate(self, positions, field):
+        """
+        A function to read a vector field on the mesh at a set of positions.
+
+        Parameters:
+            positions (ndarray): An (N,3) array of positions
+            field (ndarray): A (3,gridSize,gridSize,gridSize) array
+
+        Returns:
+            ndarray: An (N,3) array of the interpolated field
+        """
+
+        cells, weights = self._stencil(positions)
+        flat = field.reshape(3, -1)
+        return np.stack([np.sum(flat[k][cells] * weights, axis=1) for k in range(3)], axis=1)
+
+
+    def potential(self, grid, G, splitRadius):
+        """
+        A function to solve Poisson's equation on the mesh with FFTs.
+
+        The mesh is zero padded to twice its size so the convolution with the
+        Green's function has isolated (not periodic) boundaries. The Green's
+        function is the long-range part of 1/r, erf(r/(2*splitRadius))/r.
+
+        Parameters:
+            grid (ndarray): The mass in every cell, from deposit()
+            G (double): Newton's gravitational constant
+            splitRadius (double): The radius at which the force is split
+
+        Returns:
+            ndarray: A (gridSize,gridSize,gridSize) array of the potential
+        """
+
+        n = self.gridSize
+        m = 2 * n
+        k = np.arange(m)
+        k = np.minimum(k, m - k) * self.spacing
+        r = np.sqrt(k[:, np.newaxis, np.newaxis] ** 2 + k[np.newaxis, :, np.newaxis] ** 2
+                    + k[np.newaxis, np.newaxis, :] ** 2)
+        rSafe = np.where(r > 0, r, 1)
+        green = np.where(r > 0, (1 - _erfc(r / (2 * splitRadius))) / rSafe,
+                         1 / (splitRadius * np.sqrt(np.pi)))
+
+        phi = np.fft.irfftn(np.fft.rfftn(grid, s=(m, m, m)) * np.fft.rfftn(green), s=(m, m, m))
+        return -G * phi[:n, :n, :n]
+
+
+def particleMeshAccelerations(positions, masses, G, gridSize=64, shortRange=False, targets=None):
+    """
+    A function to calculate gravitational accelerations on a mesh.
+
+    The masses are deposited onto a cubic mesh covering them, the potential is
+    found with FFTs, and its gradient is interpolated back to every mass. The
+    cost grows as N + gridSize^3 log(gridSize), so this suits very large and
+    smooth distributions of mass. On its own the mesh smooths the force over
+    about SPLIT_SCALE cells. With shortRange set, pairs closer than
+    CUTOFF_SCALE split radii also get the exact short-range part of their
+    force (P3M), which makes the method accurate for clustered systems as well.
+
+    Parameters:
+        positions (ndarray): An (N,3) array of positions
+        masses (ndarray): An (N,) array of masses
+        G (double): Newton's gravitational constant
+        gridSize (int): The number of cells along each axis of the mesh
+        shortRange (bool): Whether to add the short-range correction
+        targets (ndarray): Indices of the masses to calculate, or None for all
+
+    Returns:
+        ndarray: An (N,3) array of accelerations, or (len(targets),3)
+    """
+
+    N = len(masses)
+    if targets is None:
+        targets = np.arange(N)
+    if N < 2:
+        return np.zeros((len(targets), 3))
+
+    mesh = Mesh(positions, gridSize)
+    splitRadius = SPLIT_SCALE * mesh.spacing
+    phi = mesh.potential(mesh.deposit(positions, masses), G, splitRadius)
+    field = -np.stack(np.gradient(phi, mesh.spacing))
+    acc = mesh.interpolate(positions[targets], field)
+
+    if shortRange:
+        i, j = overlappingPairs(positions, CUTOFF_SCALE * splitRadius / 2)
+        d = positions[j] - positions[i]
+        r = np.sqrt(np.einsum('ij,ij->i', d, d))
+        x = r / (2 * splitRadius)
+        shortPart = _erfc(x) + 2 * x / np.sqrt(np.pi) * np.exp(-x * x)
+        weight = G * shortPart / r ** 3
+        # The row of every mass in acc, or -1 when it is not a target
+        row = np.full(N, -1)
+        row[targets] = np.arange(len(targets))
+        for k in range(3):
+            pull = weight * d[:, k]
+            hitI = row[i] >= 0
+            hitJ = row[j] >= 0
+            acc[:, k] += np.bincount(row[i][hitI], (pull * masses[j])[hitI], minlength=len(targets))
+            acc[:, k] -= np.bincount(row[j][hitJ], (pull * masses[i])[hitJ], minlength=len(targets))
+
+    return acc
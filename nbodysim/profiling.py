@@ -0,0 +1,99 @@
+import time
+
+# The phases of a run that are timed
+PHASES = ('force', 'integrate', 'collision', 'merge', 'save', 'plot')
+
+# The events that are counted
+COUNTERS = ('steps', 'pairs', 'contacts', 'merges', 'absorbed', 'frames', 'dropped')
+
+
+class Profile:
+    """
+    The time spent in every phase of a run, and counts of what was done.
+
+    Every phase is timed exclusively: 'integrate' does not include the force
+    calculations the integrator asks for, and 'collision' does not include
+    merging. 'save' is the time step() spends handing snapshots to the
+    background writer, including any wait for its queue to have room.
+
+    Attributes:
+        times (dict): The seconds spent in every phase
+        calls (dict): The number of times every phase ran
+        counts (dict): 'steps' taken, gravitational 'pairs' summed by the
+                       direct and parallel solvers, overlapping pairs found
+                       ('contacts'), groups merged ('merges'), masses
+                       removed by merging ('absorbed'), and frames play()
+                       drew ('frames') or skipped ('dropped')
+        callback (function): Called with the report at the end of every
+                             step() call, or None
+        started (double): When profiling started, from time.perf_counter()
+    """
+
+    def __init__(self, callback=None):
+        """
+        A constructor for a Profile
+
+        Parameters:
+            callback (function): Called with the report at the end of every
+                                 step() call, or None
+        """
+
+        self.times = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.callback = callback
+        self.started = time.perf_counter()
+
+
+    def add(self, phase, seconds):
+        """
+        A function to record one run of a phase.
+
+        Parameters:
+            phase (str): The phase, one of PHASES
+            seconds (double): How long it took
+        """
+
+        self.times[phase] += seconds
+        self.calls[phase] += 1
+
+
+    def count(self, counter, number=1):
+        """
+        A function to add to one of the counts.
+
+        Parameters:
+            counter (str): The count, one of COUNTERS
+            number (int): How much to add
+        """
+
+        self.counts[counter] += number
+
+
+    def report(self):
+        """
+        A function that returns everything recorded so far.
+
+        Returns:
+            dict: {'time': seconds, 'calls': number} for every phase, every
+                  count, and 'wallTime', the seconds since profiling started
+        """
+
+        stats = {phase: {'time': self.times[phase], 'calls': self.calls[phase]}
+                 for phase in PHASES}
+        stats.update(self.counts)
+        stats['wallTime'] = time.perf_counter() - self.started
+        return stats
+
+
+    def __str__(self):
+        wallTime = time.perf_counter() - self.started
+        lines = ['{:>10} {:>10} {:>8} {:>6}'.format('phase', 'seconds', 'calls', 'share')]
+        for phase in PHASES:
+            lines.append('{:>10} {:>10.4g} {:>8} {:>6.1%}'.format(
+                phase, self.times[phase], self.calls[phase],
+                self.times[phase] / wallTime if wallTime > 0 else 0))
+        lines.append('{:>10} {:>10.4g}'.format('wall', wallTime))
+        lines.append(', '.join('{}: {}'.format(counter, self.counts[counter])
+                               for counter in COUNTERS))
+        return '\n'.join(lines)
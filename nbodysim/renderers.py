@@ -0,0 +1,198 @@
+from .decimate import density
+
+
+class Renderer:
+    """
+    The interface between a Simulator and whatever draws it.
+
+    Simulator.plot() calls show() to draw a new plot and play() calls update()
+    for every frame after it, from the thread play() was called on. A
+    renderer only has to implement these two functions, and may override
+    wantsColors() to skip gathering the colors it does not draw; anything it needs
+    (such as Bokeh) should be imported when show() is first called, so
+    simulations that never plot never load it.
+    """
+
+    def show(self, title, axes, plotRange, plotSize, columns):
+        """
+        A function to draw a new plot of the system.
+
+        Parameters:
+            title (str): The title of the plot
+            axes (tuple): The pair of axes being plotted, such as ('x','y')
+            plotRange (tuple): The range of both axes
+            plotSize (int): The width and height of the plot in pixels
+            columns (dict): The 'x', 'y', 'radius' and 'mass' of every mass as
+                            NumPy arrays, and the list of their 'color's, or
+                            None if wantsColors() said they are not drawn
+        """
+
+        raise NotImplementedError
+
+
+    def wantsColors(self, numMasses):
+        """
+        A function that returns whether the next plot or frame draws the
+        colors of the masses.
+
+        Gathering the colors takes a pass over every mass, so it is skipped
+        when this returns False and 'color' is None instead.
+
+        Parameters:
+            numMasses (int): The number of masses in the system
+
+        Returns:
+            bool: Whether the colors are needed
+        """
+
+        return True
+
+
+    def update(self, title, columns):
+        """
+        A function to redraw the plot from show() with the system as it is now.
+
+        Parameters:
+            title (str): The title of the plot
+            columns (dict): As for show()
+        """
+
+        raise NotImplementedError
+
+
+class NullRenderer(Renderer):
+    """
+    A renderer that draws nothing, for runs without a display.
+    """
+
+    def show(self, title, axes, plotRange, plotSize, columns):
+        pass
+
+
+    def update(self, title, columns):
+        pass
+
+
+    def wantsColors(self, numMasses):
+        return False
+
+
+class BokehRenderer(Renderer):
+    """
+    A renderer that draws the system as a Bokeh scatter plot.
+
+    The plot is drawn with WebGL, so the browser can keep up with many
+    thousands of masses. Beyond maxPoints masses, drawing every one would
+    only pile them on top of each other, so the plot instead shows an image
+    of how much mass is in every binSize by binSize pixel square, and the
+    colors of the masses are not used.
+
+    The image is binned over the plotted range, when the plot is drawn and
+    at every frame of play(), and not over the part of it on screen: the
+    plot is not served by a Bokeh server, so zooming in cannot ask Python
+    for finer squares and only magnifies the ones there are. To look at a
+    region in more detail, plot it again with a smaller plotRange.
+
+    Attributes:
+        notebook (bool): Whether to draw in a jupyter notebook or HTML
+        webgl (bool): Whether to draw with WebGL
+        maxPoints (int): The most masses drawn one by one
+        binSize (int): The width of the squares of the image, in pixels
+        fig (figure): The plot from the last show(), or None
+        sca (GlyphRenderer): The scatter of the masses in fig, or None when
+                             showing the image
+        img (GlyphRenderer): The image in fig, or None when showing the masses
+    """
+
+    def __init__(self, notebook=True, webgl=True, maxPoints=20000, binSize=2):
+        """
+        A constructor for a BokehRenderer
+
+        Parameters:
+            notebook (bool): Whether to draw in a jupyter notebook or HTML
+            webgl (bool): Whether to draw with WebGL
+            maxPoints (int): The most masses drawn one by one
+            binSize (int): The width of the squares of the image, in pixels
+        """
+
+        self.notebook = notebook
+        self.webgl = webgl
+        self.maxPoints = maxPoints
+        self.binSize = binSize
+        self.fig = None
+        self.sca = None
+        self.img = None
+        self._loaded = False
+
+
+    def show(self, title, axes, plotRange, plotSize, columns):
+        from bokeh.io import show, output_notebook
+        from bokeh.plotting import figure
+        from bokeh.models import LogColorMapper
+
+        if self.notebook and not self._loaded:
+            output_notebook()
+        self._loaded = True
+
+        TOOLS="hover,crosshair,pan,wheel_zoom,zoom_in,zoom_out,reset,save"
+
+        self.fig= figure(title=title,height=plotSize,
+                         width=plotSize,
+                         x_range=plotRange,
+                         y_range=plotRange,
+                         x_axis_label = axes[0]+' (m)',
+                         y_axis_label = axes[1]+' (m)',
+                         tools=TOOLS,
+                         output_backend='webgl' if self.webgl else 'canvas')
+
+        self.sca = None
+        self.img = None
+        if len(columns['x']) > self.maxPoints:
+            self._range = plotRange
+            self._bins = max(plotSize // self.binSize, 1)
+            mapper = LogColorMapper(palette='Viridis256', nan_color=(0, 0, 0, 0))
+            self.img = self.fig.image(image=[self._density(columns)], x=plotRange[0],
+                                      y=plotRange[0], dw=plotRange[1]-plotRange[0],
+                                      dh=plotRange[1]-plotRange[0], color_mapper=mapper)
+        else:
+            self.sca= self.fig.circle(columns['x'],columns['y'],radius=columns['radius'],
+                                      fill_color=columns['color'],alpha=1,line_color=None)
+        show(self.fig,notebook_handle=self.notebook)
+
+
+    def wantsColors(self, numMasses):
+        # A scatter drawn earlier keeps its colors if masses are added
+        return numMasses <= self.maxPoints or self.sca is not None
+
+
+    def _density(self, columns):
+        """
+        A function used to bin the masses into the image.
+
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        return density(columns['x'], columns['y'], columns['mass'],
+                       self._range, self._range, self._bins)
+
+
+    def update(self, title, columns):
+        from bokeh.io import push_notebook
+
+        if self.img is not None:
+            self.img.data_source.data = {'image': [self._density(columns)]}
+        else:
+            source = self.sca.data_source
+            N = len(columns['x'])
+            if len(source.data['x']) == N:
+                # Only the changes are sent, and the colors stay as they are
+                whole = slice(N)
+                source.patch({'x': [(whole, columns['x'])], 'y': [(whole, columns['y'])],
+                              'radius': [(whole, columns['radius'])]})
+            else:
+                # Masses have merged, so every column is replaced together
+                source.data = {'x': columns['x'], 'y': columns['y'],
+                               'radius': columns['radius'], 'fill_color': columns['color']}
+        self.fig.title.text = title
+        if self.notebook:
+            push_notebook()
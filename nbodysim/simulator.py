@@ -1,11 +1,79 @@
 import numpy as np
 import time
-import csv
 import os
+import threading
+from types import SimpleNamespace
+
+from .forces import directAccelerations, potentialEnergy
+from .barneshut import barnesHutAccelerations
+from .particlemesh import particleMeshAccelerations
+from .parallel import parallelAccelerations
+from .neighbors import overlappingPairs, connectedGroups
+from .kernels import startThreads
+from .trajectory import AsyncTrajectoryWriter, exportCSV, FIELDS
+from .checkpoint import writeCheckpoint, readCheckpoint
+from .profiling import Profile
+from .renderers import Renderer, NullRenderer, BokehRenderer
+from .integrators import Euler, Leapfrog, Yoshida4, RK45, BlockLeapfrog
+
+# The names of the state arrays owned by a Simulator
+_STATE_ARRAYS=('_positions','_velocities','_accelerations','_forces','_masses','_radii')
+
+# Where every saved field comes from: a state array, and its column
+_FIELD_SOURCES={'mass':('_masses',None),'radius':('_radii',None),
+                'x':('_positions',0),'y':('_positions',1),'z':('_positions',2),
+                'x-velocity':('_velocities',0),'y-velocity':('_velocities',1),
+                'z-velocity':('_velocities',2),
+                'x-acceleration':('_accelerations',0),'y-acceleration':('_accelerations',1),
+                'z-acceleration':('_accelerations',2),
+                'x-force':('_forces',0),'y-force':('_forces',1),'z-force':('_forces',2)}
+
+# The gravity solvers that can be chosen with Simulator.setSolver()
+_SOLVERS={'direct':directAccelerations,
+          'barneshut':barnesHutAccelerations,
+          'particlemesh':particleMeshAccelerations,
+          'parallel':parallelAccelerations}
+
+# The integrators that can be chosen with Simulator.setIntegrator()
+_INTEGRATORS={'euler':Euler,
+              'leapfrog':Leapfrog,
+              'yoshida4':Yoshida4,
+              'rk45':RK45,
+              'block':BlockLeapfrog}
+
+# The renderers that can be chosen with Simulator.setRenderer()
+_RENDERERS={'bokeh':BokehRenderer,
+            'none':NullRenderer}
+
+
+def _stateProperty(arrayName,column=None):
+    """
+    A function used to build the attributes of a MassObject.
+
+    The returned property reads and writes one element of a state array owned
+    by the simulator, at the row of the MassObject.
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        arrayName (str): The name of the simulator's array
+        column (int): The column of the array, or None for 1D arrays
+
+    Returns:
+        property: The attribute to place on the MassObject
+    """
+
+    if column is None:
+        def getter(self):
+            return float(getattr(self._sim,arrayName)[self._index])
+        def setter(self,value):
+            getattr(self._sim,arrayName)[self._index]=value
+    else:
+        def getter(self):
+            return float(getattr(self._sim,arrayName)[self._index,column])
+        def setter(self,value):
+            getattr(self._sim,arrayName)[self._index,column]=value
+    return property(getter,setter)
 
-#from ipywidgets import interact
-from bokeh.io import push_notebook, show, output_notebook
-from bokeh.plotting import figure
 
 class Simulator:
     """
@@ -16,7 +84,17 @@ class Simulator:
     Attributes:
         name (str): The name of the Simulation
         massList (list): a list of MassObjects used in the simulation
+        positions (ndarray): an (N,3) array of the positions of every mass
+        velocities (ndarray): an (N,3) array of the velocities of every mass
+        accelerations (ndarray): an (N,3) array of the accelerations of every mass
+        forces (ndarray): an (N,3) array of the net forces on every mass
+        masses (ndarray): an (N,) array of the mass of every mass
+        radii (ndarray): an (N,) array of the radius of every mass
         G (double): Newton's gravitational constant
+        mergeHistory (list): a record of every collision, as dictionaries
+                             with the 'time', the name of the mass the others
+                             merged 'into', and the names of the 'masses' it
+                             absorbed
         fig (figure): the object used in Bokeh's plotting functions
 
     """
@@ -26,6 +104,9 @@ class Simulator:
         An inner-class used by the simulator
 
         Main use is for the simulator. Some small functions are available.
+        A MassObject is a lightweight view of one row of the state arrays owned
+        by the Simulator, so reading or setting any of the attributes below
+        reads or writes the simulator's arrays directly.
 
         Parameters:
             name (str): Name of the mass
@@ -46,50 +127,45 @@ class Simulator:
             zAccel (double): The current acceleration in the z direction
         """
 
-        def __init__(self,name,mass,radius,
-                     xPos,yPos,zPos,xVel,yVel,zVel,
-                     color):
+        def __init__(self,simulator,index,name,color):
             """
             A constructor for a MassObject
 
-            There are no default values here, everything needs to be set if you
-            directly use this function. (Note: it is not recommended that you
-            use this function directly.)
+            The state of the mass lives in the arrays of the simulator, at the
+            row given by index. (Note: it is not recommended that you use this
+            function directly.)
 
             Parameters:
+                simulator (Simulator): The simulator that owns the state arrays
+                index (int): The row of the mass in the state arrays
                 name (str): Name of the mass
-                mass (double): Mass of the object
-                radius (double): Radius of the spherical object
                 color (3 tuple): The RGB values for the Color of the object
-                xPos (double): The current x position of the object
-                yPos (double): The current y position of the object
-                zPos (double): The current z position of the object
-                xVel (double): The current x velocity of the object
-                yVel (double): The current y velocity of the object
-                zVel (double): The current z velocity of the object
             """
+            self._sim=simulator
+            self._index=index
             self.name=name
-            self.mass=mass
-            self.radius=radius
             self.color= "#%02x%02x%02x" % color
-            
-            self.x=xPos
-            self.y=yPos
-            self.z=zPos
-            
-            self.xVel=xVel
-            self.yVel=yVel
-            self.zVel=zVel
-            
-            self.xForce=0
-            self.yForce=0
-            self.zForce=0
-            
-            self.xAccel=0
-            self.yAccel=0
-            self.zAccel=0
-            
-            
+
+        mass=_stateProperty('_masses')
+        radius=_stateProperty('_radii')
+
+        x=_stateProperty('_positions',0)
+        y=_stateProperty('_positions',1)
+        z=_stateProperty('_positions',2)
+
+        xVel=_stateProperty('_velocities',0)
+        yVel=_stateProperty('_velocities',1)
+        zVel=_stateProperty('_velocities',2)
+
+        xForce=_stateProperty('_forces',0)
+        yForce=_stateProperty('_forces',1)
+        zForce=_stateProperty('_forces',2)
+
+        xAccel=_stateProperty('_accelerations',0)
+        yAccel=_stateProperty('_accelerations',1)
+        zAccel=_stateProperty('_accelerations',2)
+
+
         def getCoordinates(self):
             """
             A simple command to get an objects current coordinates.
@@ -100,7 +176,7 @@ class Simulator:
             Returns:
                 Tuple: Returned in the form of: (x,y,z)
             """
-            return (self.x,self.y,self.z)
+            return tuple(self._sim._positions[self._index].tolist())
         
         def getVelocities(self):
             """
@@ -112,44 +188,7 @@ class Simulator:
             Returns:
                 Tuple: Returned in the form of: (x-velocity,y-velocity,z-velocity)
             """
-            return (self.xVel,self.yVel,self.zVel)
-
-        def _saveMassState(self,folder,time):
-            """
-            A function to save attributes of the MassObject to a .csv file
-
-            This function will either make a new file with the name of the
-            MassObject as the filename or append to the file with it's current
-            status.(Note: it is not recommended that you use this function 
-            directly.)
-
-            Parameters:
-                folder (str): The folder to save the file
-                time (double): number of seconds since the start of the sim
-            """
-            direc = folder + '/' + self.name + '.csv'
-            if os.path.exists(direc) and time > 0:
-                with open(direc,'a',newline='') as f:
-                    writ = csv.writer(f)
-                    writ.writerow([time,self.mass, self.radius,
-                                   self.x, self.y, self.z,
-                                   self.xVel, self.yVel, self.zVel,
-                                   self.xAccel, self.yAccel, self.zAccel,
-                                   self.xForce, self.yForce, self.zForce])
-
-            else:
-                with open(direc,'w',newline='') as f:
-                    writ = csv.writer(f)
-                    writ.writerow(['time','mass','radius','x','y','z',
-                                   'x-velocity','y-velocity','z-velocity',
-                                   'x-acceleration','y-acceleration','z-acceleration',
-                                   'x-force','y-force','z-force'])
-
-                    writ.writerow([time,self.mass,self.radius,
-                                   self.x,self.y,self.z,
-                                   self.xVel,self.yVel,self.zVel,
-                                   self.xAccel,self.yAccel,self.zAccel,
-                                   self.xForce,self.yForce,self.zForce])
+            return tuple(self._sim._velocities[self._index].tolist())
 
 
 
@@ -166,7 +205,9 @@ class Simulator:
         Parameters:
             name (str): Name of the simulation
             path (str): A path to put the output in, if desired
-            notebook (bool): Whether to output to a jupyter notebook or HTML
+            notebook (bool): Whether to output to a jupyter notebook or HTML.
+                             Nothing is loaded for plotting until the first
+                             plot, so batch runs can leave this as it is
             importSystem (str): Set this to a string of one of the pre-programmed
                                  simulation to skip adding masses.
         """
@@ -180,16 +221,120 @@ class Simulator:
         self.time=0
         self.G = 6.67259 * (10**-11)
         self.setPlot()
-        if notebook:
-            output_notebook()
-            self.notebook = True
-        else:
-            self.notebook = False
-        
+        self.setSolver()
+        self.setIntegrator()
+        self.notebook = notebook
+        self.setRenderer('bokeh', notebook=notebook)
+
+        self.massList=[]
+        self.mergeHistory=[]
+        self._nameIndex={}
+        # Every name ever given to a mass, so names are never reused in a run
+        self._usedNames=set()
+        self._nameSuffix={}
+        self._forcePositions=None
+        self._frameColors=None
+        self._writer=None
+        self._resumeTime=None
+        self._checkpoint=None
+        self._profile=None
+        self.setOutput()
+        self._resize(16)
+
         if importSystem!=None:
             self._importSystem(importSystem)
-        else:
-            self.massList=[]
+    
+
+    @property
+    def positions(self):
+        """The positions of every mass in the simulation, one row per mass."""
+        return self._positions[:len(self.massList)]
+
+    @property
+    def velocities(self):
+        """The velocities of every mass in the simulation, one row per mass."""
+        return self._velocities[:len(self.massList)]
+
+    @property
+    def accelerations(self):
+        """The accelerations of every mass in the simulation, one row per mass."""
+        return self._accelerations[:len(self.massList)]
+
+    @property
+    def forces(self):
+        """The net forces of every mass in the simulation, one row per mass."""
+        return self._forces[:len(self.massList)]
+
+    @property
+    def masses(self):
+        """The masses of every mass in the simulation, one row per mass."""
+        return self._masses[:len(self.massList)]
+
+    @property
+    def radii(self):
+        """The radii of every mass in the simulation, one row per mass."""
+        return self._radii[:len(self.massList)]
+
+
+    def _resize(self,capacity):
+        """
+        A function used to change the capacity of the state arrays.
+
+        The state arrays are allocated with spare rows so that adding masses
+        one at a time does not copy the arrays every time. Only the first
+        len(massList) rows are in use.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            capacity (int): The number of rows to allocate
+        """
+
+        N=len(self.massList)
+        for arrayName in _STATE_ARRAYS:
+            if arrayName in ('_masses','_radii'):
+                new=np.zeros(capacity)
+            else:
+                new=np.zeros((capacity,3))
+            if N>0:
+                new[:N]=getattr(self,arrayName)[:N]
+            setattr(self,arrayName,new)
+
+
+    def _compact(self,keep):
+        """
+        A function used to remove masses from the state arrays.
+
+        Every mass whose entry in keep is False is removed from the massList
+        and the state arrays in a single pass, and the remaining MassObjects
+        are pointed at their new rows.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            keep (ndarray): An (N,) boolean array of the masses to keep
+        """
+
+        keep=np.asarray(keep,dtype=bool)
+        N=len(self.massList)
+
+        # Removed masses keep a private copy of their final state
+        for i in np.flatnonzero(~keep):
+            o1=self.massList[i]
+            o1._sim=SimpleNamespace(**{arrayName:getattr(self,arrayName)[i:i+1].copy()
+                                       for arrayName in _STATE_ARRAYS})
+            o1._index=0
+            del self._nameIndex[o1.name]
+
+        kept=int(np.count_nonzero(keep))
+        for arrayName in _STATE_ARRAYS:
+            arr=getattr(self,arrayName)
+            arr[:kept]=arr[:N][keep]
+
+        newList=[]
+        for o1,k in zip(self.massList,keep):
+            if k:
+                o1._index=len(newList)
+                newList.append(o1)
+        self.massList=newList
     
     
     def _importSystem(self,name):
@@ -234,22 +379,116 @@ class Simulator:
             color (3 tuple): The RGB values for the Color of the object
         """
 
-        # Default mass names + same mass names
-        if self.getMass(name) != None:
-            i = 1
-            newName = name + '(' + str(i) + ')'
-            while self.getMass(newName) != None:
-                i += 1
-                newName = name + '(' + str(i) + ')'
-            name = newName
-        # end names
+        name = self._newName(name)
+
+        same = np.flatnonzero(np.all(self.positions == (xPos, yPos, zPos), axis=1))
+        if len(same) > 0:
+            print('Mass: {} not added (Same position as mass {})'.format(name, self.massList[same[0]].name))
+            return
 
-        for o1 in self.massList:
-            if o1.getCoordinates() == (xPos, yPos, zPos):
-                print('Mass: {} not added (Same position as mass {})'.format(name, o1.name))
+        N = len(self.massList)
+        if N == len(self._masses):
+            self._resize(max(16, 2 * N))
 
-        m = self.MassObject(name, mass, radius, xPos, yPos, zPos, xVel, yVel, zVel, color)
+        self._positions[N] = (xPos, yPos, zPos)
+        self._velocities[N] = (xVel, yVel, zVel)
+        self._accelerations[N] = 0
+        self._forces[N] = 0
+        self._masses[N] = mass
+        self._radii[N] = radius
+
+        m = self.MassObject(self, N, name, color)
         self.massList.append(m)
+        self._nameIndex[name] = m
+        self._usedNames.add(name)
+
+
+    def addMasses(self, name='mass', masses=1, radii=1, positions=None, velocities=None,
+                  color=(0,0,255)):
+        """
+        A function to add many masses to the simulation at once
+
+        This function adds a whole system in one go, which is much faster than
+        calling addMass() for every mass once there are many thousands of them.
+        The masses are named as addMass() names them, so adding three to an
+        empty simulation with name 'm' gives 'm', 'm(1)' and 'm(2)'.
+        NOTE: Masses in the same location as another mass will be discarded.
+
+        Parameters:
+            name (str): Name of the masses
+            masses (double or ndarray): The mass of every object
+            radii (double or ndarray): The radius of every object
+            positions (ndarray): An (N,3) array of positions; nothing is
+                                 added without them
+            velocities (ndarray): An (N,3) array of velocities, or None for
+                                  all at rest
+            color (3 tuple): The RGB values for the Color of the objects
+        """
+
+        if positions is None:
+            print('Masses: {} not added (No positions given)'.format(name))
+            return
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        count = len(positions)
+        masses = np.broadcast_to(np.asarray(masses, dtype=np.float64), (count,))
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (count,))
+        if velocities is None:
+            velocities = np.zeros((count, 3))
+        velocities = np.asarray(velocities, dtype=np.float64).reshape(count, 3)
+
+        # The first of every position, counting the masses already added
+        N = len(self.massList)
+        _, first = np.unique(np.concatenate([self.positions, positions]), axis=0, return_index=True)
+        keep = np.zeros(N + count, dtype=bool)
+        keep[first] = True
+        keep = keep[N:]
+        if not np.all(keep):
+            print('{} masses not added (Same position as another mass)'.format(count - np.count_nonzero(keep)))
+        count = int(np.count_nonzero(keep))
+
+        if N + count > len(self._masses):
+            self._resize(max(16, 2 * (N + count)))
+        rows = slice(N, N + count)
+        self._positions[rows] = positions[keep]
+        self._velocities[rows] = velocities[keep]
+        self._accelerations[rows] = 0
+        self._forces[rows] = 0
+        self._masses[rows] = masses[keep]
+        self._radii[rows] = radii[keep]
+
+        for i in range(N, N + count):
+            m = self.MassObject(self, i, self._newName(name), color)
+            self.massList.append(m)
+            self._nameIndex[m.name] = m
+            self._usedNames.add(m.name)
+
+
+    def _newName(self, name):
+        """
+        A function used to find the name a new mass gets.
+
+        Names already used in the run get a '(1)', '(2)' and so on, carrying
+        on from the last number given to that name so that adding many masses
+        with the same name stays fast.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            name (str): The name asked for
+
+        Returns:
+            str: A name not used yet
+        """
+
+        if name not in self._usedNames:
+            return name
+        i = self._nameSuffix.get(name, 1)
+        newName = name + '(' + str(i) + ')'
+        while newName in self._usedNames:
+            i += 1
+            newName = name + '(' + str(i) + ')'
+        # Kept rather than i+1, in case this name ends up not being used
+        self._nameSuffix[name] = i
+        return newName
 
 
     def removeMass(self, nameOrIndex):
@@ -262,7 +501,14 @@ class Simulator:
             nameOrIndex (str / int): The index or name of a mass to be removed.
         """
 
-        self.massList.remove(self.getMass(nameOrIndex))
+        o1 = self.getMass(nameOrIndex)
+        if o1 == None:
+            print('Mass: {} not found'.format(nameOrIndex))
+            return
+
+        keep = np.ones(len(self.massList), dtype=bool)
+        keep[o1._index] = False
+        self._compact(keep)
 
 
     def getMass(self, nameOrIndex):
@@ -281,9 +527,7 @@ class Simulator:
         """
 
         if isinstance(nameOrIndex, str):
-            for m1 in self.massList:
-                if m1.name == nameOrIndex:
-                    return m1
+            return self._nameIndex.get(nameOrIndex)
 
         elif isinstance(nameOrIndex, int):
             try:
@@ -299,39 +543,109 @@ class Simulator:
         A function used to step the simulation forward in time.
 
         This function steps the simulation forward in time by an amount dt using
-        a single calculation. For the simulator to be accurate, dt should be small.
+        the integrator chosen in setIntegrator(). For the simulator to be
+        accurate, dt should be small.
         (Note: it is not recommended that you use this function directly.)
 
         Parameters:
             dt (double): The distance forward in time to step
         """
 
-        N=len(self.massList)
-        #Zero net forces
-        for o1 in self.massList:
-            o1.xForce=0
-            o1.yForce=0
-            o1.zForce=0
-        
-        
-        for i in range(0,N-1):
-            o1 = self.massList[i]
-            for j in range(i+1,N):
-                o2=self.massList[j]
-                self._calcForces(o1,o2)
-        
-        for i in range(0,N):
-            o1 = self.massList[i]
-            self._calcAcceleration(o1)
-            self._calcMovement(o1,dt)
-            for j in range(0,i):
-                o2 = self.massList[j]
-                self._checkCollision(o1,o2)
+        p = self._profile
+        if p is None:
+            self._integrator.integrate(self,dt)
+        else:
+            start, force = time.perf_counter(), p.times['force']
+            self._integrator.integrate(self,dt)
+            # The force calculations it asked for are counted as 'force'
+            p.add('integrate', time.perf_counter() - start - (p.times['force'] - force))
+            p.count('steps')
         
         self.time+=dt
+
+        self._checkCollisions()
                 
     
-    def step(self,dt=1,numSteps=10,save=False):
+    def setSolver(self,solver='direct',**options):
+        """
+        A function used to choose how gravity is calculated.
+
+        The 'direct' solver sums the force between every pair of masses
+        exactly, which is O(N^2). The 'barneshut' solver groups distant masses
+        together in an octree, which is O(N log N) and much faster for large
+        systems at the cost of a small error. The 'particlemesh' solver
+        calculates gravity on a grid with FFTs, which suits millions of roughly
+        uniformly spread masses; its shortRange option adds the exact force
+        between close pairs (P3M) for clustered systems. The 'parallel' solver
+        is the direct sum split across a pool of worker processes, and gives
+        exactly the same result as 'direct'. Any options are passed on to the
+        solver.
+
+        Parameters:
+            solver (str): The name of the solver, either 'direct', 'barneshut',
+                          'particlemesh' or 'parallel'
+            options: Options for the solver:
+                     'direct' - chunkMemory (int): The maximum size in bytes of
+                                the temporary arrays
+                                jit (bool): Whether to use the compiled loop
+                                (default True when Numba is installed)
+                     'parallel' - workers (int): The number of worker processes
+                                  (default every core)
+                                  chunkMemory (int), jit (bool): As for
+                                  'direct'
+                     'barneshut' - theta (double): The opening angle, smaller is
+                                   more accurate (default 0.5)
+                     'particlemesh' - gridSize (int): The number of grid cells
+                                      along each axis (default 64)
+                                      shortRange (bool): Whether to add the
+                                      short-range correction (default False)
+        """
+
+        if solver not in _SOLVERS:
+            print('Solver "{}" not recognized.'.format(solver))
+            return
+        self.solver=solver
+        self.solverOptions=options
+
+
+    def setIntegrator(self,integrator='euler',**options):
+        """
+        A function used to choose how the masses are moved forward in time.
+
+        The 'euler' integrator is the simple first order method, which needs
+        very small steps. 'leapfrog' (kick-drift-kick, or velocity Verlet) is
+        second order and symplectic, so its energy error does not drift and it
+        allows much larger steps for the same cost. 'yoshida4' is a fourth
+        order symplectic method made of three leapfrog steps. 'rk45' is an
+        adaptive Runge-Kutta method that splits every step into as many
+        substeps as it needs to meet its error tolerance. 'block' is leapfrog
+        with a timestep for every mass, dt divided by a power of two chosen
+        from its acceleration and jerk, so that close encounters only slow
+        down the masses involved. Any options are passed on to the integrator.
+
+        Parameters:
+            integrator (str): The name of the integrator, either 'euler',
+                              'leapfrog', 'yoshida4', 'rk45' or 'block'
+            options: Options for the integrator:
+                     'rk45' - rtol (double): The relative error allowed per
+                              substep (default 1e-9)
+                              atol (double): The absolute error allowed per
+                              substep (default 0)
+                     'block' - eta (double): The accuracy parameter of the
+                               timestep criterion (default 0.02)
+                               maxLevel (int): The number of times dt may be
+                               halved (default 10)
+        """
+
+        if integrator not in _INTEGRATORS:
+            print('Integrator "{}" not recognized.'.format(integrator))
+            return
+        self.integrator=integrator
+        self.integratorOptions=options
+        self._integrator=_INTEGRATORS[integrator](**options)
+
+
+    def step(self,dt=1,numSteps=10,save=False,solver=None,integrator=None):
         """
         A function to step the simulation forward in time.
 
@@ -340,168 +654,679 @@ class Simulator:
         numSteps is the number of times to calculate this movement. dt should be
         small for the simulation to be accurate. The save boolean will save the
         state of the simulation AFTER the whole calculation. (i.e after you step
-        forward numSteps times using dt as the step size).
+        forward numSteps times using dt as the step size), or on the schedule
+        chosen with setOutput() if there is one.
 
         Parameters:
             dt (double): The distance forward in time for each step
             numSteps (int): The number of times to step forward by dt
             save (bool): Whether to save to a file after completing the function
+            solver (str): If given, the gravity solver to use from now on
+                          (see setSolver())
+            integrator (str): If given, the integrator to use from now on
+                              (see setIntegrator())
         """
+        if solver!=None and solver!=self.solver:
+            self.setSolver(solver)
+        if integrator!=None and integrator!=self.integrator:
+            self.setIntegrator(integrator)
+
         if save and self.time == 0:
             self._saveState()
 
+        scheduled = self._output['everySteps'] != None or self._output['everyTime'] != None
         for i in range(0,numSteps):
             self._singleStep(dt)
-        if save:
+            if save and scheduled and self._outputDue():
+                self._saveState()
+            if self._checkpoint != None:
+                self._autoCheckpoint()
+        if save and not scheduled:
             self._saveState()
+        if self._profile is not None and self._profile.callback is not None:
+            self._profile.callback(self.stats)
+
+
+    def _calcForces(self):
+        """
+        A function used to calculate the net force on every mass.
+
+        This function calculates the gravitational acceleration of every mass
+        due to all of the others with the solver chosen in setSolver(), and the
+        net forces that go with them.
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        self.accelerations[:] = self._accelerationsAt(self.positions)
+        self._calcAcceleration()
 
 
-    def _calcForces(self, o1, o2):
+    def _accelerationsAt(self, positions, targets=None):
         """
-        A function used to calculate the force between two masses.
+        A function used to calculate accelerations at trial positions.
 
-        This function takes in two masses and calculates the forces between them.
+        This function returns the gravitational acceleration every mass (or
+        every mass in targets) would have if the masses were at the given
+        positions, using the solver chosen in setSolver(). The state of the
+        simulator is not changed.
         (Note: it is not recommended that you use this function directly.)
 
         Parameters:
-            o1 (MassObject): The first mass used to calculate
-            o2 (MassObject): The second mass used to calculate
+            positions (ndarray): An (N,3) array of positions
+            targets (ndarray): Indices of the masses to calculate, or None for all
+
+        Returns:
+            ndarray: An (N,3) array of accelerations, or (len(targets),3)
         """
 
-        r = np.sqrt((o1.x - o2.x) ** 2 + (o1.y - o2.y) ** 2 + (o1.z - o2.z) ** 2)
-        forceMag = (self.G * (o1.mass) * (o2.mass)) / (r ** 2)
+        solve = _SOLVERS[self.solver]
+        p = self._profile
+        if p is None:
+            return solve(positions, self.masses, self.G, targets=targets, **self.solverOptions)
+
+        start = time.perf_counter()
+        accelerations = solve(positions, self.masses, self.G, targets=targets, **self.solverOptions)
+        p.add('force', time.perf_counter() - start)
+        if self.solver in ('direct', 'parallel'):
+            N = len(positions)
+            p.count('pairs', (N - 1) * (N if targets is None else len(targets)))
+        return accelerations
 
-        xhat = (o2.x - o1.x) / r
-        yhat = (o2.y - o1.y) / r
-        zhat = (o2.z - o1.z) / r
 
-        fx = forceMag * xhat
-        fy = forceMag * yhat
-        fz = forceMag * zhat
+    def _calcAcceleration(self):
+        """
+        A function to calculate the net forces from the accelerations
 
-        o1.xForce += fx
-        o1.yForce += fy
-        o1.zForce += fz
+        This function fills in the net force on every mass from the
+        accelerations calculated using _calcForces(), and remembers the
+        positions they belong to so that integrators can reuse them.
+        (Note: it is not recommended that you use this function directly.)
+        """
 
-        o2.xForce -= fx
-        o2.yForce -= fy
-        o2.zForce -= fz
+        self.forces[:] = self.masses[:, np.newaxis] * self.accelerations
+        self._forcePositions = (self.positions.copy(), self.masses.copy(),
+                                self.G, self.solver, self.solverOptions)
 
 
-    def _calcAcceleration(self, o1):
+    def _forcesCurrent(self):
         """
-        A function to calculate the total acceleration on a MassObject
+        A function used to check if the accelerations are up to date.
 
-        This function takes in a MassObject and calculates the total acceleration
-        on that object based on the net forces calculated using _calcForces().
+        The accelerations are up to date when nothing that goes into them has
+        changed since they were calculated, even if the masses were moved or
+        changed through their MassObjects.
+        (Note: it is not recommended that you use this function directly.)
+
+        Returns:
+            bool: Whether the accelerations belong to the current state
+        """
+
+        if self._forcePositions is None:
+            return False
+        positions, masses, G, solver, options = self._forcePositions
+        return (G == self.G and solver == self.solver and options is self.solverOptions
+                and np.array_equal(positions, self.positions)
+                and np.array_equal(masses, self.masses))
+
+
+    def _checkCollisions(self):
+        """
+        A function used to check if there are any collisions.
+
+        This function finds every pair of masses closer than the sum of their
+        radii once all of them have moved. A sweep-and-prune broad phase over
+        the position arrays means only pairs that are already close along one
+        axis are checked exactly. All of the contacts are then passed to
+        _combineMasses() together.
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        p = self._profile
+        if p is not None:
+            start = time.perf_counter()
+        hitsI, hitsJ = overlappingPairs(self.positions, self.radii)
+        if p is not None:
+            p.add('collision', time.perf_counter() - start)
+            p.count('contacts', len(hitsI))
+        if len(hitsI) > 0:
+            self._combineMasses(hitsI, hitsJ)
+
+
+    def _combineMasses(self, hitsI, hitsJ):
+        """
+        A function used to merge every group of colliding masses.
+
+        This function takes all of the contacts of a step and groups them with
+        union-find, so a chain of touching masses becomes one group whatever
+        order the contacts are in. Each group is combined in an inelastic
+        collision: the resulting mass has the name and position of the largest
+        mass in the group, a radius that keeps the total volume, and a
+        velocity that conserves momentum. The other masses are then removed
+        from the system in a single pass.
         (Note: it is not recommended that you use this function directly.)
 
         Parameters:
-            o1 (MassObject): The MassObject to calculate
+            hitsI (ndarray): The index of the first mass of every contact
+            hitsJ (ndarray): The index of the second mass of every contact
         """
 
-        o1.xAccel = o1.xForce / o1.mass
-        o1.yAccel = o1.yForce / o1.mass
-        o1.zAccel = o1.zForce / o1.mass
+        p = self._profile
+        if p is not None:
+            start = time.perf_counter()
+        N = len(self.massList)
+        group = connectedGroups(N, hitsI, hitsJ)
+
+        # Dominate mass: the largest of each group, ties going to the later mass
+        order = np.lexsort((np.arange(N), self.masses, group))
+        last = np.r_[group[order][1:] != group[order][:-1], True]
+        dom = np.zeros(N, dtype=np.int64)
+        dom[group[order][last]] = order[last]
+        dom = dom[group]
+
+        # combine masses
+        newM = np.bincount(dom, self.masses, minlength=N)
 
+        # combine radii
+        newR = np.cbrt(np.bincount(dom, self.radii ** 3, minlength=N))
 
-    def _calcMovement(self, o1, dt):
+        # combine velocities
+        momentum = np.stack([np.bincount(dom, self.masses * self.velocities[:, k], minlength=N)
+                             for k in range(3)], axis=1)
+
+        isDom = dom == np.arange(N)
+        merged = isDom & (np.bincount(dom, minlength=N) > 1)
+
+        absorbed = np.flatnonzero(~isDom)
+        for d in np.flatnonzero(merged):
+            self.mergeHistory.append({'time': self.time, 'into': self.massList[d].name,
+                                      'masses': [self.massList[i].name
+                                                 for i in absorbed[dom[absorbed] == d]]})
+        self.velocities[merged] = momentum[merged] / newM[merged, np.newaxis]
+        self.radii[merged] = newR[merged]
+        self.masses[merged] = newM[merged]
+
+        self._compact(isDom)
+        if p is not None:
+            p.add('merge', time.perf_counter() - start)
+            p.count('merges', int(np.count_nonzero(merged)))
+            p.count('absorbed', len(absorbed))
+    
+    
+    def _saveState(self):
         """
-        A function used to calculate a MassObject's movement.
+        A function used to save the current state of the system to a file
 
-        This function takes in a MassObject and a dt and calculates the motion
-        based on the acceleration calculated in _calcAcceleration().
+        This function takes a copy of the current state of the system and
+        hands it to a background thread that appends it to the trajectory file
+        as one snapshot, so the simulation carries on while it is written.
         (Note: it is not recommended that you use this function directly.)
+        """
+        p = self._profile
+        if p is not None:
+            start = time.perf_counter()
+        if self._writer == None:
+            direc = self.path+'/'+self.name
+            if not os.path.exists(direc):
+                os.mkdir(direc)
+            self._writer = AsyncTrajectoryWriter(self.getTrajectoryPath(), append=self.time > 0,
+                                                 after=self._resumeTime,
+                                                 fields=self._output['fields'],
+                                                 dtype=self._output['dtype'])
+            self._resumeTime = None
+
+        out = self._output
+        if out['masses'] == None:
+            rows = slice(None)
+            names = [o1.name for o1 in self.massList]
+        else:
+            rows = np.array([o1._index for o1 in self.massList if o1.name in out['masses']],
+                            dtype=np.int64)
+            names = [self.massList[i].name for i in rows]
+
+        N = len(self.massList)
+        data = np.empty((len(names), len(out['fields'])), dtype=out['dtype'])
+        for k, field in enumerate(out['fields']):
+            arrayName, column = _FIELD_SOURCES[field]
+            if column == None:
+                data[:, k] = getattr(self, arrayName)[:N][rows]
+            else:
+                data[:, k] = getattr(self, arrayName)[:N, column][rows]
+        self._writer.write(self.time, names, data)
+        if p is not None:
+            p.add('save', time.perf_counter() - start)
+
+
+    def setOutput(self, everySteps=None, everyTime=None, fields=FIELDS, masses=None,
+                  dtype='float64'):
+        """
+        A function to choose when and what step() and play() save.
+
+        By default a snapshot is saved at the end of every call with
+        save=True. With everySteps or everyTime, snapshots are instead saved
+        during the call, every everySteps steps or whenever the simulation
+        time passes a multiple of everyTime. Only the chosen fields of the
+        chosen masses are saved, in the chosen type; fields that are not
+        saved read back as NaN in the Analyzer, and so do the totals that
+        need them, such as its energy() and momentum().
 
         Parameters:
-            o1 (MassObject): The MassObject to calculate it's movement.
-            dt (double): The timestep to move it forward.
+            everySteps (int): The number of steps between snapshots
+            everyTime (double): The simulation time between snapshots
+            fields (tuple): The fields to save, from 'mass', 'radius', 'x',
+                            'y', 'z', 'x-velocity', ..., 'x-acceleration', ...,
+                            'x-force', ... (default all of them)
+            masses (list): The names of the masses to save, or None for all
+            dtype (str): 'float64', or 'float32' to halve the size of the file
         """
 
-        o1.x += o1.xVel * dt
-        o1.y += o1.yVel * dt
-        o1.z += o1.zVel * dt
+        unknown = [field for field in fields if field not in _FIELD_SOURCES]
+        if len(unknown) > 0:
+            print('Fields {} not recognized.'.format(unknown))
+            return
+        if np.dtype(dtype).name not in ('float64', 'float32'):
+            print('Type "{}" not supported.'.format(dtype))
+            return
+
+        # A new writer is needed for the new fields or type
+        self.close()
+        self._output = {'everySteps': everySteps, 'everyTime': everyTime,
+                        'fields': tuple(fields),
+                        'masses': None if masses == None else set(masses),
+                        'dtype': np.dtype(dtype).name,
+                        'steps': 0,
+                        'tick': self._outputTick(everyTime)}
+
+
+    def _outputTick(self, everyTime):
+        """
+        A function used to count the multiples of everyTime reached so far.
 
-        o1.xVel += o1.xAccel * dt
-        o1.yVel += o1.yAccel * dt
-        o1.zVel += o1.zAccel * dt
+        (Note: it is not recommended that you use this function directly.)
 
+        Parameters:
+            everyTime (double): The simulation time between snapshots, or None
 
-    def _checkCollision(self, o1, o2):
+        Returns:
+            int: The number of whole multiples of everyTime in the current time
         """
-        A function used to check if there is a collision.
 
-        This function is used to check if there are any collisions between
-        the two mass objects provided. If so, this function will call
-        _combineMasses().
+        if everyTime == None:
+            return 0
+        return int(np.floor(self.time / everyTime + 1e-9))
+
+
+    def _outputDue(self):
+        """
+        A function used to check if a snapshot is due after a step.
+
         (Note: it is not recommended that you use this function directly.)
 
+        Returns:
+            bool: Whether to save now
+        """
+
+        out = self._output
+        due = False
+        if out['everySteps'] != None:
+            out['steps'] += 1
+            if out['steps'] >= out['everySteps']:
+                out['steps'] = 0
+                due = True
+        if out['everyTime'] != None:
+            tick = self._outputTick(out['everyTime'])
+            if tick > out['tick']:
+                out['tick'] = tick
+                due = True
+        return due
+
+
+    def flush(self):
+        """
+        A function to wait until every saved snapshot is safely on disk.
+
+        Snapshots are written in the background, so step() and play() can
+        return before they reach the trajectory file. After flush() returns
+        all of them are there.
+        """
+
+        if self._writer != None:
+            self._writer.flush()
+
+
+    def close(self):
+        """
+        A function to finish writing the trajectory file and close it.
+
+        Saving again afterwards carries on at the end of the file. The
+        simulator can also be used in a with statement, which closes it at
+        the end.
+        """
+
+        if self._writer != None:
+            self._writer.close()
+            self._writer = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def getTrajectoryPath(self):
+        """
+        A function that returns where the simulation is saved.
+
+        Every snapshot saved with save=True goes into a single binary
+        trajectory file in a folder named after the simulation.
+
+        Returns:
+            str: The path of the trajectory file
+        """
+
+        return self.path+'/'+self.name+'/'+self.name+'.nbt'
+
+
+    def exportCSV(self, folder=None):
+        """
+        A function to write the saved trajectory out as .csv files.
+
+        This function writes one .csv file per mass with every saved snapshot
+        of that mass, in the layout older versions of the simulator saved in.
+
         Parameters:
-            o1 (MassObject): The first mass used to calculate
-            o2 (MassObject): The second mass used to calculate
+            folder (str): The folder to write the files in, by default the
+                          folder the trajectory is saved in
+        """
+
+        if self._writer != None:
+            self._writer.flush()
+        if folder == None:
+            folder = self.path+'/'+self.name
+        exportCSV(self.getTrajectoryPath(), folder)
+
+
+    def getCheckpointPath(self):
+        """
+        A function that returns where checkpoints are written by default.
+
+        Returns:
+            str: The path of the checkpoint file
         """
 
-        distance = np.sqrt((o1.x - o2.x) ** 2 + (o1.y - o2.y) ** 2 + (o1.z - o2.z) ** 2)
-        interactionR = o1.radius + o2.radius
+        return self.path+'/'+self.name+'/'+self.name+'.ckpt'
 
-        if (interactionR >= distance):
-            self._combineMasses(o1, o2)
 
+    def checkpoint(self, path=None):
+        """
+        A function to save everything needed to carry on the simulation later.
+
+        The checkpoint holds the state arrays, the names and colors of the
+        masses, the time, G, the solver and integrator with their options and
+        internal state (such as the adaptive step of 'rk45' or the levels of
+        'block'), the names used so far, the merge history and the output
+        schedule, so that
+        restore() carries on exactly where the simulation was. The file is
+        written under another name and renamed into place, so a crash while
+        writing leaves the previous checkpoint intact.
 
-    def _combineMasses(self, o1, o2):
+        Parameters:
+            path (str): The checkpoint file, by default getCheckpointPath()
         """
-        A constructor for a MassObject
 
-        This function takes two MassObjects and adds them together in an
-        inelastic collision. The resulting mass will have the name of the larger
-        mass, a radius proportional to the addition two volumes, and velocities
-        calculated based on conservation of momentum. The smaller mass is then
-        removed from the system.
+        if path == None:
+            path = self.getCheckpointPath()
+        if self._writer != None:
+            self._writer.flush()
+        writeCheckpoint(path, *self._getState())
+
+
+    def _getState(self):
+        """
+        A function used to gather everything checkpoint() saves.
+
         (Note: it is not recommended that you use this function directly.)
 
+        Returns:
+            tuple: (info, arrays), a dictionary that can be saved as JSON and
+                   a dictionary of arrays
+        """
+
+        N = len(self.massList)
+        arrays = {arrayName: getattr(self, arrayName)[:N] for arrayName in _STATE_ARRAYS}
+        integratorState = {}
+        for key, value in vars(self._integrator).items():
+            if isinstance(value, np.ndarray):
+                arrays['integrator_'+key] = value
+            elif value is None or isinstance(value, (bool, int, float)):
+                integratorState[key] = value
+
+        info = {'name': self.name,
+                'time': self.time,
+                'G': self.G,
+                'names': [o1.name for o1 in self.massList],
+                'colors': [o1.color for o1 in self.massList],
+                'usedNames': sorted(self._usedNames),
+                'mergeHistory': self.mergeHistory,
+                'solver': self.solver,
+                'solverOptions': self.solverOptions,
+                'integrator': self.integrator,
+                'integratorOptions': self.integratorOptions,
+                'integratorState': integratorState,
+                'forcesCurrent': self._forcesCurrent(),
+                'output': dict(self._output, fields=list(self._output['fields']),
+                               masses=None if self._output['masses'] == None
+                               else sorted(self._output['masses']))}
+        return info, arrays
+
+
+    def restore(self, path=None):
+        """
+        A function to carry on a simulation from a checkpoint.
+
+        Everything saved by checkpoint() replaces the current state of the
+        simulator. If the simulation is saved, snapshots in its trajectory
+        file that are later than the checkpoint are dropped when the next one
+        is saved, so the file matches the resumed run.
+
         Parameters:
-            o1 (MassObject): The first mass used to combine
-            o2 (MassObject): The second mass used to combine
+            path (str): The checkpoint file, by default getCheckpointPath()
         """
 
-        # Dominate mass
-        if (o1.mass >= o2.mass):
-            dom = o1
-            sub = o2
-        else:
-            dom = o2
-            sub = o1
+        if path == None:
+            path = self.getCheckpointPath()
+        if not os.path.exists(path):
+            print('Checkpoint: {} not found'.format(path))
+            return
+        self._setState(*readCheckpoint(path))
 
-        # combine masses
-        newM = dom.mass + sub.mass
 
-        # combine radii
-        dom.radius = (dom.radius ** 3 + sub.radius ** 3) ** (1 / 3)
+    def _setState(self, info, arrays):
+        """
+        A function used to replace the state of the simulator with one from
+        _getState().
 
-        # combine velocities
-        dom.xVel = (dom.mass * dom.xVel + sub.mass * sub.xVel) / newM
-        dom.yVel = (dom.mass * dom.yVel + sub.mass * sub.yVel) / newM
-        dom.zVel = (dom.mass * dom.zVel + sub.mass * sub.zVel) / newM
+        (Note: it is not recommended that you use this function directly.)
 
-        dom.mass = newM  # setting this value after its final use
+        Parameters:
+            info (dict): The dictionary from _getState()
+            arrays (dict): The arrays from _getState()
+        """
 
-        self.massList.remove(sub)
-    
-    
-    def _saveState(self):
+        if self._writer != None:
+            self._writer.close()
+            self._writer = None
+
+        self.name = info['name']
+        self.time = info['time']
+        self.G = info['G']
+        self.setSolver(info['solver'], **info['solverOptions'])
+        self.setIntegrator(info['integrator'], **info['integratorOptions'])
+        for key, value in info['integratorState'].items():
+            setattr(self._integrator, key, value)
+        for key, value in arrays.items():
+            if key.startswith('integrator_'):
+                setattr(self._integrator, key[len('integrator_'):], value)
+
+        N = len(info['names'])
+        self.massList = []
+        self._nameIndex = {}
+        self._resize(max(16, N))
+        for arrayName in _STATE_ARRAYS:
+            getattr(self, arrayName)[:N] = arrays[arrayName]
+        for i, (name, color) in enumerate(zip(info['names'], info['colors'])):
+            m = self.MassObject(self, i, name, tuple(int(color[k:k+2], 16) for k in (1, 3, 5)))
+            self.massList.append(m)
+            self._nameIndex[name] = m
+
+        output = info['output']
+        self._output = dict(output, fields=tuple(output['fields']),
+                            masses=None if output['masses'] == None else set(output['masses']))
+        self._usedNames = set(info['usedNames'])
+        self._nameSuffix = {}
+        self.mergeHistory = info['mergeHistory']
+        self._forcePositions = None
+        if info['forcesCurrent']:
+            self._calcAcceleration()
+        self._resumeTime = self.time
+
+
+    def setCheckpoint(self, path=None, everySteps=None, everySeconds=None):
         """
-        A function used to save the current state of the system to a file
+        A function to checkpoint the simulation automatically while it runs.
+
+        During step() and play() a checkpoint is written whenever everySteps
+        steps or everySeconds seconds of wall time have passed since the last
+        one, whichever comes first. Call it with neither to stop.
+
+        Parameters:
+            path (str): The checkpoint file, by default getCheckpointPath()
+            everySteps (int): The number of steps between checkpoints
+            everySeconds (double): The wall time in seconds between checkpoints
+        """
+
+        if everySteps == None and everySeconds == None:
+            self._checkpoint = None
+            return
+        self._checkpoint = {'path': path, 'everySteps': everySteps,
+                            'everySeconds': everySeconds,
+                            'steps': 0, 'last': time.time()}
+
+
+    def _autoCheckpoint(self):
+        """
+        A function used to write a checkpoint when one is due.
 
-        This function takes the current state of the system and saves it to a
-        file.
         (Note: it is not recommended that you use this function directly.)
         """
-        direc = self.path+'/'+self.name
-        if not os.path.exists(direc):
-            os.mkdir(direc)
 
-        for o1 in self.massList:
-            o1._saveMassState(direc,self.time)
+        c = self._checkpoint
+        c['steps'] += 1
+        if ((c['everySteps'] != None and c['steps'] >= c['everySteps']) or
+                (c['everySeconds'] != None and time.time() - c['last'] >= c['everySeconds'])):
+            self.checkpoint(c['path'])
+            c['steps'] = 0
+            c['last'] = time.time()
+
+
+    def setProfiling(self, enabled=True, callback=None):
+        """
+        A function to turn on or off timing of where a run spends its time.
+
+        While profiling is on, the wall time and number of calls of every
+        phase (force calculation, integration, collision checks, merging,
+        saving and plotting) are recorded, along with the number of steps,
+        gravitational pairs, contacts, merges and frames drawn and skipped by
+        play(), and reported by stats.
+        Turning it on again starts from zero. When it is off nothing is
+        recorded and nothing is slowed down.
+
+        Parameters:
+            enabled (bool): Whether to profile
+            callback (function): If given, called with stats at the end of
+                                 every call of step() (from play()'s
+                                 background thread while playing)
+        """
+
+        self._profile = Profile(callback) if enabled else None
+
+
+    @property
+    def stats(self):
+        """
+        What profiling has recorded since setProfiling() turned it on: a
+        dictionary of {'time': seconds, 'calls': number} for each of 'force',
+        'integrate', 'collision', 'merge', 'save' and 'plot', plus the counts
+        'steps', 'pairs', 'contacts', 'merges', 'absorbed', 'frames' and
+        'dropped' and the total
+        'wallTime'. None when profiling is off.
+        """
+        if self._profile is None:
+            return None
+        return self._profile.report()
+
+
+    def printStats(self):
+        """
+        A function to print what profiling has recorded as a table.
+        """
+
+        if self._profile is None:
+            print('Profiling is off, turn it on with setProfiling().')
+            return
+        print(self._profile)
+
+
+    def getEnergy(self):
+        """
+        A function that returns the total energy of the system.
+
+        This function adds the kinetic energy of every mass to the
+        gravitational potential energy of every pair of masses. With a good
+        integrator this should barely change as the simulation runs.
+
+        Returns:
+            double: The total energy of the system in joules
+        """
+
+        kinetic = 0.5 * np.sum(self.masses * np.einsum('ij,ij->i', self.velocities, self.velocities))
+        return float(kinetic) + potentialEnergy(self.positions, self.masses, self.G)
+
+
+    def setRenderer(self,renderer='bokeh',**options):
+        """
+        A function used to choose what draws the plots of plot() and play().
+
+        The 'bokeh' renderer draws a Bokeh scatter plot, loading Bokeh only
+        when the first plot is drawn. The 'none' renderer draws nothing, so
+        play() just runs the simulation, for batch runs without a display.
+        Any other drawing code can be used by passing an object with the
+        functions of nbodysim.renderers.Renderer instead of a name.
+
+        Parameters:
+            renderer (str): The name of the renderer, either 'bokeh' or
+                            'none', or a Renderer
+            options: Options for the renderer:
+                     'bokeh' - notebook (bool): Whether to draw in a jupyter
+                               notebook or HTML (default True)
+                               webgl (bool): Whether to draw with WebGL
+                               (default True)
+                               maxPoints (int): The most masses drawn one by
+                               one; more are shown as an image of how much
+                               mass is in every few pixels (default 20000)
+                               binSize (int): The width in pixels of the
+                               squares of that image (default 2)
+        """
+
+        if isinstance(renderer, Renderer):
+            self.renderer=renderer
+            return
+        if renderer not in _RENDERERS:
+            print('Renderer "{}" not recognized.'.format(renderer))
+            return
+        self.renderer=_RENDERERS[renderer](**options)
 
 
     def setPlot(self,plotTitle='N-Body Sim',plotRange=(-5,5),plotSize=600):
@@ -533,6 +1358,11 @@ class Simulator:
         This function will plot the current state of the system, either in a
         notebook or HTML, using the axis specified in the tuple labeled "axes".
         The optional parameter "plotRange" can be used in place of setPlot().
+        The plot is drawn by the renderer chosen with setRenderer(); the
+        'bokeh' renderer shows very large systems as an image of where the
+        mass is instead of drawing every mass. The image is binned over
+        plotRange, so zooming in on it does not add detail; plot again with
+        a smaller plotRange instead.
 
         Parameters:
             axes (tuple): A pair of chars (either 'x', 'y', or 'z') corresponding
@@ -541,143 +1371,227 @@ class Simulator:
                                plots. This will correspond to every axis range.
         """
 
+        start = time.perf_counter()
         if plotRange!=None:
             self.plotRange=plotRange
-        
-        xp=[]
-        yp=[]
-        rad=[]
-        colors=[]
-        
-        for o1 in self.massList:
-            if axes[0]=='x':
-                xp.append(o1.x)
-            elif axes[0]=='y':
-                xp.append(o1.y)
-            else:
-                xp.append(o1.z)
-                
-            if axes[1]=='x':
-                yp.append(o1.x)
-            elif axes[1]=='y':
-                yp.append(o1.y)
-            else:
-                yp.append(o1.z)
-                
-            rad.append(o1.radius)
-            colors.append(o1.color)
-        
-        TOOLS="hover,crosshair,pan,wheel_zoom,zoom_in,zoom_out,reset,save"
-        
-        timedTitle = self.plotTitle+'\t \t'+self.getTime()
-        
-        self.fig= figure(title=timedTitle,plot_height=self.plotSize,
-                         plot_width=self.plotSize,
-                         x_range=self.plotRange,
-                         y_range=self.plotRange,
-                         x_axis_label = axes[0]+' (m)',
-                         y_axis_label = axes[1]+' (m)',
-                         tools=TOOLS)
 
-        self.sca= self.fig.scatter(xp,yp,radius=rad,fill_color=colors,alpha=1,line_color=None)
-        show(self.fig,notebook_handle=True)
+        # Colors may have been changed by hand since the last plot
+        self._frameColors = None
+        frame = self._snapshot()
+        self.renderer.show(self.plotTitle+'\t \t'+self.getTime(frame[0]),axes,
+                           self.plotRange,self.plotSize,self._frameColumns(axes,frame))
+        if self._profile is not None:
+            self._profile.add('plot', time.perf_counter() - start)
 
 
     def play(self,dt=.1,numSteps=10,save=False,pause=0,
-             plotFirst=True,axes=('x','y'),plotRange=None):
+             plotFirst=True,axes=('x','y'),plotRange=None,integrator=None,
+             fps=30,endTime=None):
         """
         A function to show the simulation evolve over time.
 
         Similar to the step() function, this method will move the simulation
         forward in time. To stop this funcion, simply use a keyboard interrupt
-        (ctrl+c) or press the stop button in jupyter notebooks. The total time
-        elapsed per frame is t=dt*numSteps, where dt is the step size and
-        numSteps is the number of times to calculate this movement. Pause is the
-        numebr of seconds between frames. Setting save to True will save the
-        state of the system after each set of numSteps. plotFirst is for either
-        creating a new plot or updating an old one. axes correspond to the axes
-        to show the system and plotRange is for setting the square range of the
-        plot on both axes.
+        (ctrl+c) or press the stop button in jupyter notebooks. The simulation
+        runs on a background thread, numSteps steps of size dt at a time,
+        and after each set of numSteps it publishes a frame of the system.
+        The plot is redrawn with the latest frame up to fps times a second,
+        so a slow plot never holds up the simulation: frames published in
+        between are simply skipped. Pause is the number of seconds the
+        simulation waits after every frame, to slow it down. Setting save
+        to True will save the state of the system after each set of
+        numSteps. plotFirst is for either creating a new plot or updating
+        an old one. axes correspond to the axes to show the system and
+        plotRange is for setting the square range of the plot on both axes.
 
         Parameters:
             dt (double): The distance forward in time for each step
             numSteps (int): The number of times to step forward by dt
             save (boolean): Whether to save to a file after completing the function
-            pause (double): Time in seconds to pause between frames
+            pause (double): Time in seconds to pause after every frame
             plotFirst (boolean): Whether to generate a new plot before playing
             axes (tuple): A pair of chars (either 'x', 'y', or 'z') corresponding
                           to the axis in which to plot
             plotRange (tuple): A pair of doubles that describes the range of the
                                plots. This will correspond to every axis range.
+            integrator (str): If given, the integrator to use from now on
+                              (see setIntegrator())
+            fps (double): The most times a second to redraw the plot
+            endTime (double): If given, the simulation time to stop at
+                              instead of running until interrupted
 
         """
 
+        if integrator!=None and integrator!=self.integrator:
+            self.setIntegrator(integrator)
         if plotFirst:
             self.plot(axes,plotRange)
-        
+
+        self._frame = None
+        self._frameLock = threading.Lock()
+        # The compiled loops must not start their threads on the worker
+        startThreads()
+        stop = threading.Event()
+        failure = []
+        worker = threading.Thread(target=self._stepLoop,
+                                  args=(dt,numSteps,save,pause,endTime,stop,failure),
+                                  daemon=True)
+        worker.start()
+
+        interval = 1/fps
+        nextFrame = time.perf_counter()
         try:
-            while True:
-                self.step(dt,numSteps,save)
-                time.sleep(pause)
-                self._updatePlot(axes)
+            while worker.is_alive() or self._frame is not None:
+                with self._frameLock:
+                    frame, self._frame = self._frame, None
+                if frame is not None:
+                    self._updatePlot(axes, frame)
+                nextFrame = max(nextFrame + interval, time.perf_counter())
+                stop.wait(nextFrame - time.perf_counter())
             
         except KeyboardInterrupt:
             print("Halted")
+        finally:
+            stop.set()
+            worker.join()
+        if failure:
+            raise failure[0]
 
 
-    def _updatePlot(self, axes):
+    def _stepLoop(self, dt, numSteps, save, pause, endTime, stop, failure):
         """
-        A function used to update the Bokeh plots.
+        A function run on a background thread by play() to step the
+        simulation and publish frames until it is stopped.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            dt (double), numSteps (int), save (bool), pause (double),
+            endTime (double): As for play()
+            stop (Event): Set to stop
+            failure (list): Any error is put here for play() to raise
+        """
+
+        try:
+            while not stop.is_set():
+                if endTime != None:
+                    if self.time >= endTime - dt/2:
+                        break
+                    numSteps = min(numSteps, max(int(round((endTime - self.time)/dt)), 1))
+                self.step(dt,numSteps,save)
+                self._publishFrame()
+                if pause > 0:
+                    stop.wait(pause)
+        except Exception as error:
+            failure.append(error)
+
+
+    def _snapshot(self):
+        """
+        A function used to copy what the plots show of the current state.
+
+        The colors are only gathered from the masses again when masses have
+        been merged, added or removed, and not at all when the renderer does
+        not draw them.
+        (Note: it is not recommended that you use this function directly.)
+
+        Returns:
+            tuple: (time, positions, radii, masses, colors), copies that are
+                   not changed by stepping the simulation, with colors None
+                   when they are not drawn
+        """
+
+        N = len(self.massList)
+        colors = None
+        if self.renderer.wantsColors(N):
+            key = (N, len(self.mergeHistory), len(self._usedNames))
+            if self._frameColors is None or self._frameColors[0] != key:
+                self._frameColors = (key, [o1.color for o1 in self.massList])
+            colors = self._frameColors[1]
+        return (self.time, self.positions.copy(), self.radii.copy(), self.masses.copy(),
+                colors)
+
+
+    def _frameColumns(self, axes, frame):
+        """
+        A function used to pick the columns a renderer draws out of a
+        snapshot.
 
-        This function is used internally to update the plots as they progress
-        using the play() function. Axes is specified as a tuple for the axes
-        being plotted.
         (Note: it is not recommended that you use this function directly.)
 
         Parameters:
             axes (tuple): A pair of chars (either 'x', 'y', or 'z') corresponding
                           to the axis in which to plot
+            frame (tuple): A snapshot from _snapshot()
+
+        Returns:
+            dict: The 'x', 'y', 'radius', 'mass' and 'color' of every mass
         """
 
-        xp = []
-        yp = []
-        rad = []
-        for o1 in self.massList:
-            if axes[0] == 'x':
-                xp.append(o1.x)
-            elif axes[0] == 'y':
-                xp.append(o1.y)
-            else:
-                xp.append(o1.z)
+        frameTime, positions, radii, masses, colors = frame
+        return {'x':positions[:,'xyz'.index(axes[0])],
+                'y':positions[:,'xyz'.index(axes[1])],
+                'radius':radii,'mass':masses,'color':colors}
 
-            if axes[1] == 'x':
-                yp.append(o1.x)
-            elif axes[1] == 'y':
-                yp.append(o1.y)
-            else:
-                yp.append(o1.z)
 
-            rad.append(o1.radius)
+    def _publishFrame(self):
+        """
+        A function used to make the current state the latest frame for play()
+        to draw.
+
+        The frame is a copy, so the simulation can carry on while it is
+        drawn, and replaces any frame that has not been drawn yet.
+        (Note: it is not recommended that you use this function directly.)
+        """
 
-        self.sca.data_source.data['x'] = xp
-        self.sca.data_source.data['y'] = yp
-        self.sca.data_source.data['radius'] = rad
-        self.fig.title.text = self.plotTitle + '\t \t' + self.getTime()
-        push_notebook()
+        frame = self._snapshot()
+        with self._frameLock:
+            if self._frame is not None and self._profile is not None:
+                self._profile.count('dropped')
+            self._frame = frame
 
 
-    def getTime(self):
+    def _updatePlot(self, axes, frame):
+        """
+        A function used to update the plots.
+
+        This function is used internally to update the plots as they progress
+        using the play() function, through the renderer chosen with
+        setRenderer(). Axes is specified as a tuple for the axes being
+        plotted.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            axes (tuple): A pair of chars (either 'x', 'y', or 'z') corresponding
+                          to the axis in which to plot
+            frame (tuple): A snapshot from _snapshot()
+        """
+
+        start = time.perf_counter()
+        self.renderer.update(self.plotTitle + '\t \t' + self.getTime(frame[0]),
+                             self._frameColumns(axes, frame))
+        if self._profile is not None:
+            self._profile.add('plot', time.perf_counter() - start)
+            self._profile.count('frames')
+
+
+    def getTime(self,simTime=None):
         """
         A function that returns the current simulation time.
 
-        This function has no parameters, but returns the current time of the
-        system if a form: Years, Days, hh:mm:ss.
+        This function returns the current time of the system, or the time
+        given, in a form: Years, Days, hh:mm:ss.
+
+        Parameters:
+            simTime (double): A time to show instead of the current time
 
         Returns:
             str: A string representing the time.
         """
 
-        y, rem = divmod(self.time,31536000)
+        if simTime == None:
+            simTime = self.time
+        y, rem = divmod(simTime,31536000)
         d, rem = divmod(rem, 86400)
         h, rem = divmod(rem, 3600)
         m, s = divmod(rem, 60)
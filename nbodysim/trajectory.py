@@ -0,0 +1,800 @@
+import atexit
+import csv
+import json
+import os
+import queue
+import struct
+import threading
+import weakref
+
+import numpy as np
+
+# The columns saved for every mass, in the same order as the .csv files
+FIELDS = ('mass', 'radius', 'x', 'y', 'z',
+          'x-velocity', 'y-velocity', 'z-velocity',
+          'x-acceleration', 'y-acceleration', 'z-acceleration',
+          'x-force', 'y-force', 'z-force')
+
+FILE_MAGIC = b'NBODYTRJ'
+FILE_VERSION = 1
+CHUNK_MAGIC = b'CHNK'
+
+# The number of snapshots an AsyncTrajectoryWriter holds before write() waits
+QUEUE_SIZE = 8
+
+# The fraction of the masses of a chunk that must still exist for snapshots
+# to keep going in it, rather than in a new chunk without the merged ones
+MIN_LIVE_FRACTION = 0.5
+
+# The field that is the time derivative of each field, used to interpolate
+_DERIVATIVES = {'x': 'x-velocity', 'y': 'y-velocity', 'z': 'z-velocity',
+                'x-velocity': 'x-acceleration', 'y-velocity': 'y-acceleration',
+                'z-velocity': 'z-acceleration'}
+
+# magic, version
+_FILE_HEADER = struct.Struct('<8sI4x')
+# magic, length of the whole chunk header, number of snapshots (-1 while
+# the chunk is still being written), number of masses, length of the JSON
+_CHUNK_HEADER = struct.Struct('<4s4xqqqq')
+
+
+def _recordType(numMasses, numFields, dtype):
+    """
+    A function used to build the NumPy type of one snapshot record.
+
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        numMasses (int): The number of masses in the chunk
+        numFields (int): The number of fields saved for every mass
+        dtype (str): The type the values are saved as
+
+    Returns:
+        dtype: A structured type with a float64 'time' and a 'values' block
+    """
+
+    return np.dtype([('time', '<f8'), ('values', np.dtype(dtype).newbyteorder('<'),
+                                       (numMasses, numFields))])
+
+
+def _interpolate(time, t0, t1, y0, y1, d0, d1):
+    """
+    A function used to interpolate values between two snapshots.
+
+    A cubic Hermite curve is used where the time derivatives d0 and d1 are
+    known, and a straight line where they are NaN.
+    (Note: it is not recommended that you use this function directly.)
+
+    Parameters:
+        time (double): The time to interpolate to
+        t0, t1 (double): The times of the two snapshots
+        y0, y1 (ndarray): The values at the two snapshots
+        d0, d1 (ndarray): The time derivatives of the values, or NaN
+
+    Returns:
+        ndarray: The values at time
+    """
+
+    h = t1 - t0
+    s = (time - t0) / h
+    hermite = ((2 * s ** 3 - 3 * s ** 2 + 1) * y0 + (s ** 3 - 2 * s ** 2 + s) * h * d0
+               + (-2 * s ** 3 + 3 * s ** 2) * y1 + (s ** 3 - s ** 2) * h * d1)
+    linear = (1 - s) * y0 + s * y1
+    return np.where(np.isnan(d0) | np.isnan(d1), linear, hermite)
+
+
+class TrajectoryWriter:
+    """
+    A class that appends snapshots of a simulation to a binary trajectory file.
+
+    A trajectory file is a short file header followed by chunks. Each chunk
+    starts with a header holding the names of its masses, the saved fields,
+    the value type, and the mass, first time and last time of every mass
+    (their lifetimes), followed by fixed-width records, one per snapshot: the
+    time, then every field of every mass. A mass that has merged into another
+    is saved as NaN for the rest of the chunk. A new chunk is started when a
+    mass that is not in the current chunk appears, or when fewer than
+    MIN_LIVE_FRACTION of the masses of the current chunk are left, so runs
+    with many merges do not keep writing the masses that merged away.
+
+    The last chunk is left open with a snapshot count of -1, and readers work
+    its length out from the size of the file, so a run that stops at any
+    point leaves a readable file.
+
+    Attributes:
+        path (str): The trajectory file
+        fields (tuple): The names of the fields saved for every mass
+        dtype (str): The type the values are saved as
+    """
+
+    def __init__(self, path, append=False, fields=FIELDS, dtype='float64', after=None):
+        """
+        A constructor for a TrajectoryWriter
+
+        Parameters:
+            path (str): The trajectory file
+            append (bool): Whether to add to the file if it already exists,
+                           rather than starting it again
+            fields (tuple): The names of the fields saved for every mass
+            dtype (str): The type the values are saved as
+            after (double): When appending, snapshots later than this time
+                            are dropped first, as when a run is resumed from
+                            a checkpoint
+        """
+
+        self.path = path
+        self.fields = tuple(fields)
+        self.dtype = np.dtype(dtype).name
+        self._chunk = None
+
+        if append and os.path.exists(path):
+            # Close whatever chunk was left open, new snapshots go in a new one
+            reader = TrajectoryReader(path)
+            self._file = open(path, 'r+b')
+            chunks = reader.chunks
+            count = len(chunks[-1].times) if chunks else 0
+            if after is not None:
+                for k, chunk in enumerate(chunks):
+                    later = np.flatnonzero(chunk.times > after)
+                    if len(later) > 0:
+                        count = int(later[0])
+                        chunks = chunks[:k + 1]
+                        if count == 0 and k > 0:
+                            chunks = chunks[:k]
+                            count = len(chunks[-1].times)
+                        break
+            if chunks:
+                last = chunks[-1]
+                self._file.seek(last.offset + 16)
+                self._file.write(struct.pack('<q', count))
+                if after is not None and count > 0:
+                    # Masses that ended after the cut lasted to the new end
+                    lastTime = last.times[count - 1]
+                    end = np.where(last.end > lastTime, np.nan, last.end)
+                    self._file.seek(last.dataOffset - 8 * len(last.names))
+                    self._file.write(end.astype('<f8').tobytes())
+                self._file.seek(last.dataOffset + count * last.recordType.itemsize)
+                self._file.truncate()
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(_FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self._file.seek(0, os.SEEK_END)
+
+
+    def _startChunk(self, time, names, data):
+        """
+        A function used to close the current chunk and start a new one.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            time (double): The time of the first snapshot of the chunk
+            names (tuple): The names of the masses in the chunk
+            data (ndarray): The (N,len(fields)) values of the first snapshot
+        """
+
+        self._closeChunk()
+
+        n = len(names)
+        text = json.dumps({'names': list(names), 'fields': list(self.fields),
+                           'dtype': self.dtype}).encode('utf-8')
+        text += b' ' * (-len(text) % 8)
+        headerLength = _CHUNK_HEADER.size + len(text) + 3 * 8 * n
+
+        if 'mass' in self.fields:
+            masses = data[:, self.fields.index('mass')].astype('<f8')
+        else:
+            masses = np.full(n, np.nan)
+
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(_CHUNK_HEADER.pack(CHUNK_MAGIC, headerLength, -1, n, len(text)))
+        self._file.write(text)
+        self._file.write(masses.tobytes())
+        self._file.write(np.full(n, time, dtype='<f8').tobytes())
+        self._file.write(np.full(n, np.nan, dtype='<f8').tobytes())
+
+        self._chunk = {'offset': offset,
+                       'endOffset': offset + headerLength - 8 * n,
+                       'names': tuple(names),
+                       'slots': {name: i for i, name in enumerate(names)},
+                       'alive': np.ones(n, dtype=bool),
+                       'recordType': _recordType(n, len(self.fields), self.dtype),
+                       'count': 0,
+                       'lastTime': time}
+
+
+    def _closeChunk(self):
+        """
+        A function used to write the final snapshot count of the current chunk.
+
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        if self._chunk is not None:
+            self._file.seek(self._chunk['offset'] + 16)
+            self._file.write(struct.pack('<q', self._chunk['count']))
+            self._file.seek(0, os.SEEK_END)
+            self._chunk = None
+
+
+    def write(self, time, names, data):
+        """
+        A function to append one snapshot to the file.
+
+        Parameters:
+            time (double): The time of the snapshot
+            names (sequence): The names of the masses, one per row of data
+            data (ndarray): An (N,len(fields)) array of the saved fields
+        """
+
+        names = tuple(names)
+        chunk = self._chunk
+        if (chunk is None or len(names) < MIN_LIVE_FRACTION * len(chunk['names'])
+                or not all(name in chunk['slots'] for name in names)):
+            self._startChunk(time, names, data)
+            chunk = self._chunk
+
+        if names == chunk['names']:
+            slots = None
+        else:
+            slots = np.fromiter((chunk['slots'][name] for name in names), dtype=np.int64,
+                                count=len(names))
+
+        # Masses that have disappeared since the last snapshot end their lifetimes
+        present = np.zeros(len(chunk['names']), dtype=bool)
+        present[slice(None) if slots is None else slots] = True
+        ended = np.flatnonzero(chunk['alive'] & ~present)
+        if len(ended) > 0:
+            for slot in ended:
+                self._file.seek(chunk['endOffset'] + 8 * slot)
+                self._file.write(struct.pack('<d', chunk['lastTime']))
+            self._file.seek(0, os.SEEK_END)
+            chunk['alive'] &= present
+
+        record = np.zeros(1, dtype=chunk['recordType'])
+        record['time'] = time
+        if slots is None:
+            record['values'][0] = data
+        else:
+            record['values'][0] = np.nan
+            record['values'][0][slots] = data
+        self._file.write(record.tobytes())
+        chunk['count'] += 1
+        chunk['lastTime'] = time
+
+
+    def flush(self):
+        """
+        A function to push everything written so far to the operating system.
+        """
+
+        self._file.flush()
+
+
+    def close(self):
+        """
+        A function to finish the current chunk and close the file.
+        """
+
+        if not self._file.closed:
+            self._closeChunk()
+            self._file.close()
+
+
+class AsyncTrajectoryWriter:
+    """
+    A class that writes snapshots to a trajectory file on a background thread.
+
+    write() only puts the snapshot in a queue and returns, and a writer
+    thread drains the queue into a TrajectoryWriter, so saving overlaps with
+    the simulation. When the queue is full write() waits for the thread to
+    catch up, which bounds the memory used by snapshots in flight. The file
+    is handed to the operating system whenever the queue runs dry, and
+    flush() waits until everything written so far is on disk. It can be used
+    as a context manager, which closes it at the end.
+
+    Attributes:
+        path (str): The trajectory file
+    """
+
+    def __init__(self, path, queueSize=QUEUE_SIZE, **options):
+        """
+        A constructor for an AsyncTrajectoryWriter
+
+        Parameters:
+            path (str): The trajectory file
+            queueSize (int): The number of snapshots that can wait to be written
+            options: Passed on to the TrajectoryWriter
+        """
+
+        self.path = path
+        self._writer = TrajectoryWriter(path, **options)
+        self._queue = queue.Queue(maxsize=queueSize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        _asyncWriters.add(self)
+
+
+    def _run(self):
+        """
+        The loop of the writer thread.
+
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._writer.write(*item)
+                    if self._queue.empty():
+                        self._writer.flush()
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+
+    def _raise(self):
+        """
+        A function used to pass an error from the writer thread on to the caller.
+
+        (Note: it is not recommended that you use this function directly.)
+        """
+
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+
+    def write(self, time, names, data):
+        """
+        A function to queue one snapshot to be appended to the file.
+
+        The arrays are not copied, so they must not be changed afterwards.
+
+        Parameters:
+            time (double): The time of the snapshot
+            names (sequence): The names of the masses, one per row of data
+            data (ndarray): An (N,len(fields)) array of the saved fields
+        """
+
+        self._raise()
+        self._queue.put((time, names, data))
+
+
+    def flush(self):
+        """
+        A function to wait until every queued snapshot is safely on disk.
+        """
+
+        self._queue.join()
+        self._raise()
+        self._writer.flush()
+        os.fsync(self._writer._file.fileno())
+
+
+    def close(self):
+        """
+        A function to write out every queued snapshot, stop the thread and
+        close the file.
+        """
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._writer.close()
+        self._raise()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Writers whose queues are written out when Python exits
+_asyncWriters = weakref.WeakSet()
+
+
+@atexit.register
+def _closeAsyncWriters():
+    """
+    A function used to write out every queued snapshot when Python exits.
+
+    (Note: it is not recommended that you use this function directly.)
+    """
+
+    for writer in list(_asyncWriters):
+        writer.close()
+
+
+class TrajectoryChunk:
+    """
+    A class describing one chunk of a trajectory file.
+
+    Attributes:
+        names (list): The names of the masses in the chunk
+        slots (dict): The position of every mass in names, by name
+        fields (list): The names of the fields saved for every mass
+        masses (ndarray): The mass of every mass at the start of the chunk
+        start (ndarray): The first time every mass was saved
+        end (ndarray): The last time every mass was saved, or NaN if it
+                       lasted to the end of the chunk
+        times (ndarray): The time of every snapshot
+        values (ndarray): A (snapshots, masses, fields) array of the values
+        offset (int): The position of the chunk in the file
+        dataOffset (int): The position of the first record in the file
+        recordType (dtype): The NumPy type of one record
+    """
+    pass
+
+
+class TrajectoryReader:
+    """
+    A class that reads a trajectory file written by a TrajectoryWriter.
+
+    Only the chunk headers are read when the reader is made; the records are
+    memory-mapped, so values are only read from disk when they are used.
+
+    Attributes:
+        path (str): The trajectory file
+        chunks (list): A TrajectoryChunk for every chunk in the file
+    """
+
+    def __init__(self, path):
+        """
+        A constructor for a TrajectoryReader
+
+        Parameters:
+            path (str): The trajectory file
+        """
+
+        self.path = path
+        self.chunks = []
+        self.generation = 0
+        self._size = 0
+        self._index = None
+        self.refresh()
+
+
+    def refresh(self):
+        """
+        A function to pick up anything written to the file since it was read.
+
+        Only the last chunk known so far and any chunks after it are read
+        again, so the cost does not grow with the length of the run. If the
+        file has been started again from scratch, every chunk is read again
+        and generation goes up by one.
+
+        Returns:
+            bool: Whether anything changed
+        """
+
+        size = os.path.getsize(self.path)
+        if size == self._size:
+            return False
+
+        with open(self.path, 'rb') as f:
+            if size < self._size or not self.chunks:
+                magic, version = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+                if magic != FILE_MAGIC:
+                    raise ValueError('{} is not a trajectory file'.format(self.path))
+                if self.chunks:
+                    self.generation += 1
+                self.chunks = []
+                offset = _FILE_HEADER.size
+            else:
+                offset = self.chunks.pop().offset
+
+            while offset + _CHUNK_HEADER.size <= size:
+                f.seek(offset)
+                magic, headerLength, count, n, textLength = _CHUNK_HEADER.unpack(
+                    f.read(_CHUNK_HEADER.size))
+                if magic != CHUNK_MAGIC or offset + headerLength > size:
+                    break
+                info = json.loads(f.read(textLength).decode('utf-8'))
+                lifetimes = np.frombuffer(f.read(3 * 8 * n), dtype='<f8').reshape(3, n)
+
+                chunk = TrajectoryChunk()
+                chunk.names = info['names']
+                chunk.slots = {name: i for i, name in enumerate(chunk.names)}
+                chunk.fields = info['fields']
+                chunk.masses, chunk.start, chunk.end = lifetimes.copy()
+                chunk.offset = offset
+                chunk.dataOffset = offset + headerLength
+                chunk.recordType = _recordType(n, len(chunk.fields), info['dtype'])
+                if count < 0:
+                    # An open chunk ends at the last complete record
+                    count = (size - chunk.dataOffset) // chunk.recordType.itemsize
+                if count > 0:
+                    records = np.memmap(self.path, dtype=chunk.recordType, mode='r',
+                                        offset=chunk.dataOffset, shape=(count,))
+                else:
+                    records = np.zeros(0, dtype=chunk.recordType)
+                chunk.times = records['time']
+                chunk.values = records['values']
+                self.chunks.append(chunk)
+                offset = chunk.dataOffset + count * chunk.recordType.itemsize
+
+        self._size = size
+        return True
+
+
+    def position(self):
+        """
+        A function that returns where the records read so far end.
+
+        Passing the result as start to massData() or massColumn() later on
+        returns only the snapshots written in between.
+
+        Returns:
+            tuple: (chunk, record), the index of the last chunk and the number
+                   of records read from it
+        """
+
+        if not self.chunks:
+            return (0, 0)
+        return (len(self.chunks) - 1, len(self.chunks[-1].times))
+
+
+    def names(self):
+        """
+        A function that lists every mass saved in the file.
+
+        Returns:
+            list: The names of the masses, in the order they first appear
+        """
+
+        seen = {}
+        for chunk in self.chunks:
+            for name in chunk.names:
+                seen.setdefault(name, None)
+        return list(seen)
+
+
+    def _alive(self, chunk, slot, first=0):
+        """
+        A function used to find the snapshots of a chunk a mass exists in.
+
+        Only one field is read to decide: the mass if it was saved, otherwise
+        the first saved field.
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            chunk (TrajectoryChunk): The chunk
+            slot (int): The position of the mass in the chunk
+            first (int): The first snapshot to look at
+
+        Returns:
+            ndarray: A boolean array with one entry per snapshot from first on
+        """
+
+        field = chunk.fields.index('mass') if 'mass' in chunk.fields else 0
+        return ~np.isnan(chunk.values[first:, slot, field])
+
+
+    def _records(self, start):
+        """
+        A function used to list the records from a position onwards.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            start (tuple): A position from position()
+
+        Returns:
+            list: (chunk, first record) for every chunk from the position on
+        """
+
+        chunkIndex, record = start
+        return [(chunk, record if k == chunkIndex else 0)
+                for k, chunk in enumerate(self.chunks) if k >= chunkIndex]
+
+
+    def massColumn(self, name, field, start=(0, 0)):
+        """
+        A function that returns one saved field of one mass.
+
+        Only that field (and the one needed to tell which snapshots the mass
+        exists in) is read from the file.
+
+        Parameters:
+            name (str): The name of the mass
+            field (str): The name of the field, or 'time'
+            start (tuple): A position from position() to read from
+
+        Returns:
+            ndarray: The value of the field in every snapshot the mass exists in
+        """
+
+        parts = []
+        for chunk, first in self._records(start):
+            slot = chunk.slots.get(name)
+            if slot is None:
+                continue
+            alive = np.flatnonzero(self._alive(chunk, slot, first)) + first
+            if field == 'time':
+                parts.append(np.asarray(chunk.times[alive]))
+            elif field in chunk.fields:
+                column = chunk.values[:, slot, chunk.fields.index(field)]
+                parts.append(np.asarray(column[alive], dtype=np.float64))
+            else:
+                parts.append(np.full(np.count_nonzero(alive), np.nan))
+        if not parts:
+            return np.zeros(0)
+        return np.concatenate(parts)
+
+
+    def massData(self, name, start=(0, 0)):
+        """
+        A function that returns every saved snapshot of one mass.
+
+        The result has the same layout as the .csv files: one row per
+        snapshot in which the mass exists, with the time in the first column
+        followed by every field in FIELDS. Fields that were not saved are NaN.
+
+        Parameters:
+            name (str): The name of the mass
+            start (tuple): A position from position() to read from
+
+        Returns:
+            ndarray: A (snapshots, 1+len(FIELDS)) array
+        """
+
+        parts = []
+        for chunk, first in self._records(start):
+            slot = chunk.slots.get(name)
+            if slot is None:
+                continue
+            alive = np.flatnonzero(self._alive(chunk, slot, first)) + first
+            values = np.full((len(alive), 1 + len(FIELDS)), np.nan)
+            values[:, 0] = chunk.times[alive]
+            columns = [1 + FIELDS.index(field) for field in chunk.fields]
+            values[:, columns] = chunk.values[alive, slot, :]
+            parts.append(values)
+        if not parts:
+            return np.zeros((0, 1 + len(FIELDS)))
+        return np.concatenate(parts)
+
+
+    def _timeIndex(self):
+        """
+        A function used to build, or extend, the index of snapshot times.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Returns:
+            dict: The 'times' of every snapshot in the file, in order, with the
+                  'chunk' and 'record' each one is found at
+        """
+
+        index = self._index
+        if index is None or index['generation'] != self.generation:
+            index = {'generation': self.generation, 'position': (0, 0),
+                     'times': np.zeros(0), 'chunk': np.zeros(0, dtype=np.int64),
+                     'record': np.zeros(0, dtype=np.int64)}
+        if index['position'] != self.position():
+            # Records at or after the position are read again, since the last
+            # chunk may have been replaced by refresh()
+            k = index['position'][0]
+            keep = np.count_nonzero(index['chunk'] < k) + index['position'][1]
+            times = [index['times'][:keep]]
+            chunkOf = [index['chunk'][:keep]]
+            recordOf = [index['record'][:keep]]
+            for chunk, first in self._records(index['position']):
+                count = len(chunk.times) - first
+                times.append(np.asarray(chunk.times[first:], dtype=np.float64))
+                chunkOf.append(np.full(count, k, dtype=np.int64))
+                recordOf.append(np.arange(first, len(chunk.times), dtype=np.int64))
+                k += 1
+            index['times'] = np.concatenate(times)
+            index['chunk'] = np.concatenate(chunkOf)
+            index['record'] = np.concatenate(recordOf)
+            index['position'] = self.position()
+        self._index = index
+        return index
+
+
+    def _snapshot(self, row, fields):
+        """
+        A function used to read the masses that exist in one snapshot.
+
+        (Note: it is not recommended that you use this function directly.)
+
+        Parameters:
+            row (int): The snapshot, counted across the whole file
+            fields (tuple): The names of the fields to read
+
+        Returns:
+            tuple: (names, values, rates), the names of the masses, an
+                   (N,len(fields)) array of the fields and an array of their
+                   time derivatives (NaN where they were not saved)
+        """
+
+        index = self._index
+        chunk = self.chunks[index['chunk'][row]]
+        record = np.asarray(chunk.values[index['record'][row]], dtype=np.float64)
+        alive = np.flatnonzero(~np.isnan(record[:, chunk.fields.index('mass')
+                                                 if 'mass' in chunk.fields else 0]))
+        values = np.full((len(alive), len(fields)), np.nan)
+        rates = np.full((len(alive), len(fields)), np.nan)
+        for k, field in enumerate(fields):
+            if field in chunk.fields:
+                values[:, k] = record[alive, chunk.fields.index(field)]
+            if _DERIVATIVES.get(field) in chunk.fields:
+                rates[:, k] = record[alive, chunk.fields.index(_DERIVATIVES[field])]
+        return [chunk.names[i] for i in alive], values, rates
+
+
+    def state(self, time, fields=('x', 'y', 'z', 'x-velocity', 'y-velocity', 'z-velocity'),
+              interpolate=False):
+        """
+        A function that returns the state of every mass at a given time.
+
+        The snapshot is found by a binary search of an index of the snapshot
+        times, which is built the first time it is needed and extended after
+        refresh(). Without interpolation the last snapshot at or before the
+        time is returned. With it, the fields are interpolated between that
+        snapshot and the next: with a cubic Hermite curve where the time
+        derivative of a field was saved too (positions from velocities,
+        velocities from accelerations), and linearly otherwise. Masses that
+        merge away before the next snapshot keep the values of the first.
+        Times outside the run give its first or last snapshot.
+
+        Parameters:
+            time (double): The time
+            fields (tuple): The names of the fields to return
+            interpolate (bool): Whether to interpolate between snapshots
+
+        Returns:
+            tuple: (names, values), the names of the masses that exist at
+                   that time and an (N,len(fields)) array of their fields
+        """
+
+        fields = tuple(fields)
+        times = self._timeIndex()['times']
+        if len(times) == 0:
+            return [], np.zeros((0, len(fields)))
+
+        row = int(np.clip(np.searchsorted(times, time, side='right') - 1, 0, len(times) - 1))
+        names, values, rates = self._snapshot(row, fields)
+        if not interpolate or row + 1 >= len(times) or not times[row] < time < times[row + 1]:
+            return names, values
+
+        nextNames, nextValues, nextRates = self._snapshot(row + 1, fields)
+        slots = {name: i for i, name in enumerate(nextNames)}
+        here = np.array([i for i, name in enumerate(names) if name in slots], dtype=np.int64)
+        there = np.array([slots[names[i]] for i in here], dtype=np.int64)
+
+        values[here] = _interpolate(time, times[row], times[row + 1], values[here],
+                                    nextValues[there], rates[here], nextRates[there])
+        return names, values
+
+
+def exportCSV(path, folder):
+    """
+    A function to write a trajectory file out as one .csv file per mass.
+
+    The files have the same layout as the ones the simulator used to write,
+    so older tools can read them.
+
+    Parameters:
+        path (str): The trajectory file
+        folder (str): The folder to write the .csv files in
+    """
+
+    reader = TrajectoryReader(path)
+    if not os.path.exists(folder):
+        os.mkdir(folder)
+    for name in reader.names():
+        with open(folder + '/' + name + '.csv', 'w', newline='') as f:
+            writ = csv.writer(f)
+            writ.writerow(['time'] + list(FIELDS))
+            writ.writerows(reader.massData(name).tolist())
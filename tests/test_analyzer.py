@@ -0,0 +1,108 @@
+import numpy as np
+
+from nbodysim.simulator import Simulator
+from nbodysim.analyzer import Analyzer
+
+
+def _savedRun(path, numMasses=20):
+    sim = Simulator(name='run', path=str(path), notebook=False)
+    sim.G = 1
+    rng = np.random.default_rng(0)
+    sim.addMasses('m', 1, 1e-3, rng.normal(size=(numMasses, 3)))
+    sim.setIntegrator('leapfrog')
+    sim.step(1e-3, 2, save=True)
+    sim.flush()
+    return sim
+
+
+def test_refresh_leaves_masses_unread(tmp_path):
+    sim = _savedRun(tmp_path)
+    analyzer = Analyzer(simulator=sim, notebook=False, cache=False)
+    assert len(analyzer.massData) == 20
+    assert len(analyzer.massData._loaded) == 0
+
+    sim.step(1e-3, 2, save=True)
+    sim.flush()
+    analyzer.updateData()
+    assert 'm' in analyzer.massData
+    assert 'nope' not in analyzer.massData
+    assert len(analyzer.massData._loaded) == 0
+
+    analyzer.massData['m(3)']
+    analyzer.updateData()
+    assert list(analyzer.massData._loaded) == ['m(3)']
+    sim.close()
+
+
+def test_simulator_snapshots_are_flushed(tmp_path):
+    sim = Simulator(name='run', path=str(tmp_path), notebook=False)
+    sim.addMass('a', 1, 0.1)
+    sim.addMass('b', 1, 0.1, 1)
+    for i in range(5):
+        sim.step(1, 1, save=True)
+    analyzer = Analyzer(simulator=sim, notebook=False, cache=False)
+    assert len(analyzer.massData['a']) == 6
+
+    for i in range(3):
+        sim.step(1, 1, save=True)
+    analyzer.updateData()
+    assert len(analyzer.massData['a']) == 9
+    sim.close()
+
+
+def test_exported_csv_does_not_duplicate_masses(tmp_path):
+    sim = Simulator(name='zz', path=str(tmp_path), notebook=False)
+    for i in range(5):
+        sim.addMass('m', 1, 0.01, i, 0, 0, 0, 0.1, 0)
+    sim.step(0.01, 5, save=True)
+    sim.exportCSV()
+    analyzer = Analyzer(simulator=sim, notebook=False, cache=False)
+    names, positions, velocities = analyzer.stateAt(0.05)
+    assert sorted(names) == sorted(o1.name for o1 in sim.massList)
+    assert positions.shape == (5, 3)
+
+    sim.step(0.01, 5, save=True)
+    analyzer.updateData()
+    assert len(analyzer.massData['m(1)']) == 3
+    names, positions, velocities = analyzer.stateAt(0.1)
+    assert len(names) == 5
+    assert np.allclose(positions, sim.positions[[sim.getMass(n)._index for n in names]])
+    sim.close()
+
+
+def test_totals_of_unsaved_fields_are_nan(tmp_path):
+    for k, fields in enumerate([('mass', 'x', 'y', 'z'), ('x', 'y', 'z', 'x-velocity',
+                                                          'y-velocity', 'z-velocity')]):
+        (tmp_path / str(k)).mkdir()
+        sim = Simulator(name='run', path=str(tmp_path / str(k)), notebook=False)
+        sim.G = 1
+        rng = np.random.default_rng(0)
+        sim.addMasses('m', 1, 1e-3, rng.normal(size=(5, 3)), rng.normal(size=(5, 3)))
+        sim.setOutput(everySteps=1, fields=fields)
+        sim.step(1e-3, 3, save=True)
+        sim.flush()
+        analyzer = Analyzer(simulator=sim, notebook=False, cache=False)
+        times, energies = analyzer.energy()
+        assert len(times) == 4 and np.all(np.isnan(energies))
+        assert np.all(np.isnan(analyzer.momentum()[1]))
+        centers = analyzer.centerOfMass()[1]
+        assert np.all(np.isfinite(centers)) == ('mass' in fields)
+        sim.close()
+
+
+def test_restarted_run_drops_masses_that_are_gone(tmp_path):
+    sim = _savedRun(tmp_path)
+    analyzer = Analyzer(simulator=sim, notebook=False, cache=False)
+    analyzer.massData['m(3)']
+    sim.close()
+
+    # The same run started again from scratch with fewer masses
+    sim = Simulator(name='run', path=str(tmp_path), notebook=False)
+    sim.addMasses('m', 1, 1e-3, np.eye(3))
+    sim.step(1e-3, 1, save=True)
+    sim.flush()
+    analyzer.simulator = sim
+    analyzer.updateData()
+    assert sorted(analyzer.massData) == ['m', 'm(1)', 'm(2)']
+    assert len(analyzer.massData['m(1)']) == 2
+    sim.close()
@@ -0,0 +1,61 @@
+import numpy as np
+
+from nbodysim.barneshut import barnesHutAccelerations
+from nbodysim.forces import directAccelerations
+
+
+def _blob(seed=0, N=3000):
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(N, 3)), rng.random(N) + 0.5
+
+
+def _relativeErrors(approx, exact):
+    return np.linalg.norm(approx - exact, axis=1) / np.linalg.norm(exact, axis=1)
+
+
+def test_theta_zero_is_the_direct_sum():
+    positions, masses = _blob(N=500)
+    exact = directAccelerations(positions, masses, 1.0, jit=False)
+    tree = barnesHutAccelerations(positions, masses, 1.0, theta=0)
+    # Only the order of the sums differs
+    assert np.max(_relativeErrors(tree, exact)) < 1e-12
+
+
+def test_theta_half_accuracy():
+    for seed in range(2):
+        positions, masses = _blob(seed)
+        exact = directAccelerations(positions, masses, 1.0, jit=False)
+        errors = _relativeErrors(barnesHutAccelerations(positions, masses, 1.0, theta=0.5), exact)
+        assert np.median(errors) < 0.004
+        assert np.percentile(errors, 99) < 0.02
+
+
+def test_theta_large_accuracy():
+    for seed in range(2):
+        positions, masses = _blob(seed)
+        exact = directAccelerations(positions, masses, 1.0, jit=False)
+        errors = _relativeErrors(barnesHutAccelerations(positions, masses, 1.0, theta=0.8), exact)
+        assert np.median(errors) < 0.01
+        assert np.percentile(errors, 99) < 0.06
+
+
+def test_cells_holding_the_target_are_opened():
+    # A lone mass in one corner of a cell with a tight cluster in the other,
+    # so the cell's center of mass is far enough away to pass the test
+    rng = np.random.default_rng(0)
+    half = np.vstack([[[0.02, 0.02, 0.02]], 0.95 + 0.01 * rng.normal(size=(20, 3))])
+    positions = np.vstack([half, -half])
+    masses = np.ones(len(positions))
+    exact = directAccelerations(positions, masses, 1.0, jit=False)
+    for theta in (0.8, 1.0):
+        errors = _relativeErrors(barnesHutAccelerations(positions, masses, 1.0, theta=theta), exact)
+        assert errors[0] < 1e-6
+        assert np.max(errors) < 0.1
+
+
+def test_targets_match_all_rows():
+    positions, masses = _blob(N=400)
+    targets = np.array([5, 17, 399, 0])
+    everything = barnesHutAccelerations(positions, masses, 1.0)
+    some = barnesHutAccelerations(positions, masses, 1.0, targets=targets)
+    assert np.allclose(some, everything[targets], rtol=1e-12, atol=0)
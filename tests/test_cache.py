@@ -0,0 +1,60 @@
+import numpy as np
+
+from nbodysim.cache import ParseCache
+from nbodysim.simulator import Simulator
+from nbodysim.analyzer import Analyzer
+
+
+def test_put_and_get(tmp_path):
+    source = tmp_path / 'a.csv'
+    source.write_text('x\n1\n')
+    cache = ParseCache(str(tmp_path / '.cache'))
+    assert cache.get(str(source)) is None
+    cache.put(str(source), np.arange(4.0))
+    assert np.array_equal(cache.get(str(source)), np.arange(4.0))
+
+
+def test_unwritable_folder_skips_caching(tmp_path):
+    sim = Simulator(name='run', path=str(tmp_path), notebook=False)
+    sim.addMass('a', 1, 0.1)
+    sim.addMass('b', 1, 0.1, 1)
+    sim.step(1, 3, save=True)
+    sim.exportCSV()
+    sim.close()
+    run = tmp_path / 'run'
+    (run / 'run.nbt').unlink()
+    # A file where the cache folder should be, so it cannot be written
+    (run / '.cache').write_text('')
+
+    analyzer = Analyzer(path=str(run), notebook=False)
+    assert len(analyzer.massData['a']) == 2
+    assert analyzer.cache.get(str(run / 'a.csv')) is None
+
+
+def test_rows_appended_during_a_cached_read_are_kept(tmp_path):
+    sim = Simulator(name='run', path=str(tmp_path), notebook=False)
+    sim.addMass('a', 1, 0.1)
+    sim.addMass('b', 1, 0.1, 1)
+    sim.step(1, 3, save=True)
+    sim.exportCSV()
+    sim.close()
+    run = tmp_path / 'run'
+    (run / 'run.nbt').unlink()
+    source = run / 'a.csv'
+    assert len(Analyzer(path=str(run), notebook=False).massData['a']) == 2
+
+    analyzer = Analyzer(path=str(run), notebook=False)
+    cachedGet = analyzer.cache.get
+    lastRow = source.read_text().splitlines()[-1]
+
+    def getWhileWriting(path, info=None):
+        # The run saves another row while the cached array is being opened
+        data = cachedGet(path, info)
+        with open(source, 'a') as f:
+            f.write(lastRow + '\n')
+        return data
+
+    analyzer.cache.get = getWhileWriting
+    assert len(analyzer.massData['a']) == 2
+    analyzer.massData.refresh()
+    assert len(analyzer.massData['a']) == 3
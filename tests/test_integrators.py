@@ -0,0 +1,19 @@
+import numpy as np
+
+from nbodysim.simulator import Simulator
+from nbodysim.integrators import BlockLeapfrog
+from nbodysim.forces import directJerk
+
+
+def test_first_jerk_without_the_direct_sum():
+    rng = np.random.default_rng(0)
+    sim = Simulator()
+    sim.addMasses(masses=rng.random(500) + 0.5, positions=rng.normal(size=(500, 3)),
+                  velocities=0.3 * rng.normal(size=(500, 3)))
+    sim.G = 1.0
+    sim.setSolver('barneshut')
+    sim._calcForces()
+    exact = directJerk(sim.positions, sim.velocities, sim.masses, sim.G)
+    estimate = BlockLeapfrog(maxLevel=15)._firstJerk(sim, 1.0)
+    ratios = np.linalg.norm(estimate, axis=1) / np.linalg.norm(exact, axis=1)
+    assert abs(np.median(ratios) - 1) < 0.05
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+
+def test_unimportable_numba_falls_back_to_numpy(tmp_path):
+    # A Numba that is installed but cannot be imported, as with a NumPy it
+    # does not support
+    (tmp_path / 'numba').mkdir()
+    (tmp_path / 'numba' / '__init__.py').write_text(
+        "raise ImportError('Numba needs an older NumPy')\n")
+    script = ("from nbodysim.simulator import Simulator\n"
+              "from nbodysim import kernels\n"
+              "sim = Simulator()\n"
+              "sim.addMasses(masses=[1e20, 1e20], radii=1e5,\n"
+              "              positions=[[0, 0, 0], [1e6, 0, 0]])\n"
+              "sim.step(1, 5)\n"
+              "sim.step(1, 5)\n"
+              "print(kernels.HAVE_NUMBA)\n")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), root]))
+    result = subprocess.run([sys.executable, '-c', script], env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    lines = result.stdout.splitlines()
+    assert lines[-1] == 'False'
+    assert sum('Numba could not be imported' in line for line in lines) == 1
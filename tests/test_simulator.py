@@ -0,0 +1,44 @@
+from nbodysim.simulator import Simulator
+from nbodysim.renderers import Renderer
+
+
+class _Recorder(Renderer):
+    def __init__(self):
+        self.titles = []
+
+    def show(self, title, axes, plotRange, plotSize, columns):
+        pass
+
+    def update(self, title, columns):
+        self.titles.append(title)
+
+
+def test_play_draws_the_last_frame():
+    sim = Simulator()
+    sim.addMasses(masses=[1e20, 1e20], positions=[[0, 0, 0], [1e6, 0, 0]])
+    sim.setProfiling(True)
+    for run in range(5):
+        recorder = _Recorder()
+        sim.setRenderer(recorder)
+        sim.play(dt=1, numSteps=1, endTime=sim.time + 200, fps=1000)
+        assert recorder.titles[-1].endswith(sim.getTime())
+    stats = sim.stats
+    assert stats['frames'] + stats['dropped'] == stats['steps']
+
+
+def test_add_masses_needs_positions(capsys):
+    sim = Simulator()
+    sim.addMasses(masses=[1, 1])
+    assert 'No positions given' in capsys.readouterr().out
+    assert len(sim.massList) == 0
+
+
+def test_colors_are_only_gathered_when_drawn():
+    sim = Simulator()
+    sim.addMasses(masses=[1, 1, 1], positions=[[0, 0, 0], [1, 0, 0], [2, 0, 0]])
+    sim.setRenderer('none')
+    assert sim._snapshot()[4] is None
+    sim.setRenderer(_Recorder())
+    assert len(sim._snapshot()[4]) == 3
+    sim.setRenderer('bokeh', maxPoints=2)
+    assert sim._snapshot()[4] is None
@@ -0,0 +1,22 @@
+import numpy as np
+
+from nbodysim.trajectory import TrajectoryWriter, TrajectoryReader, FIELDS
+
+
+def test_merged_masses_are_dropped_from_new_chunks(tmp_path):
+    path = str(tmp_path / 'run.nbt')
+    names = ['m{}'.format(i) for i in range(100)]
+    writer = TrajectoryWriter(path)
+    # Half of the masses that are left merge away at every snapshot
+    for step in range(6):
+        left = names[:100 >> step]
+        writer.write(float(step), left, np.full((len(left), len(FIELDS)), float(step)))
+    writer.close()
+
+    reader = TrajectoryReader(path)
+    assert [len(chunk.names) for chunk in reader.chunks] == [100, 25, 12, 3]
+    np.testing.assert_array_equal(reader.massColumn('m0', 'time'), np.arange(6.0))
+    np.testing.assert_array_equal(reader.massColumn('m30', 'time'), [0, 1])
+    np.testing.assert_array_equal(reader.massColumn('m10', 'x'), [0, 1, 2, 3])
+    names, values = reader.state(4.5, fields=('x',))
+    assert names == ['m0', 'm1', 'm2', 'm3', 'm4', 'm5']